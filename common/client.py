@@ -1,17 +1,19 @@
 # vim set fileencoding=utf-8
 """client module"""
-import math
+import asyncio
+import csv
+import json
 import os
+from collections import defaultdict, deque, namedtuple
 from timeit import default_timer
 from typing import IO
 from urllib import parse
 from urllib.request import Request
 
-import httpx
-import numpy as np
+import pandas as pd
 from httpx import HTTPStatusError
 
-from common import utils
+from common import cpp_pool, http_cache, http_coalesce, http_pool, http_retry, utils
 from common.error import QtError, QtException
 from common.qt_logging import frame_log
 from common.request_context import Request as RequestContext
@@ -25,6 +27,13 @@ except ImportError:
 
 DEFAULT_REQUEST_TIMEOUT = 5
 HTTP_PROXY = None
+DEFAULT_BATCH_CONCURRENCY = 32  # 批量请求全局并发数
+DEFAULT_HOST_CONCURRENCY = 8  # 批量请求单个host并发数
+STREAM_CHUNK_SIZE = 64 * 1024  # 流式读取每块字节数
+CPP_BATCH_CHUNKSIZE = 500  # 批量qtlib调用每块行数
+
+# 批量请求单项结果, index为请求在输入中的序号, 失败时result为None, error为QtException
+BatchResult = namedtuple("BatchResult", ["index", "result", "error"])
 
 
 def add_turing_username_secret(req):
@@ -69,26 +78,53 @@ def cgi_request(url,
                 headers=None,
                 timeout=None,
                 resp_header=None,
+                retry_policy=http_retry.NO_RETRY,
+                use_cache=False,
+                coalesce=False,
                 **para):
-    """公共cgi请求-同步"""
+    """公共cgi请求-同步
+
+    :param retry_policy: http_retry.RetryPolicy，默认http_retry.NO_RETRY不重试，
+                         传入DEFAULT_RETRY_POLICY等重试幂等请求；目标host熔断时抛出E_CIRCUIT_OPEN
+    :param use_cache: GET请求是否使用http_cache响应缓存(按Cache-Control及ETag/Last-Modified校验)
+    :param coalesce: 是否将相同请求(method、url、请求头、请求体均相同)的并发调用合并为一次网络调用，
+                     仅合并幂等请求(见http_coalesce.request_key)；各调用方分别执行decoder
+    """
     req = build_cgi_request(url, req_method, data, headers, prepare, **para)
     if timeout is None:
         timeout = DEFAULT_REQUEST_TIMEOUT
     proxy_url = os.environ.get("http_proxy")
     try:
-        with httpx.Client(proxies=proxy_url) as client:
-            resp = client.request(req.get_method(),
-                                  req.get_full_url(),
-                                  data=data,
-                                  headers=req.headers,
-                                  timeout=timeout)
+        # 按host复用连接池中的keep-alive连接
+        client = http_pool.get_client(req.get_full_url(), proxy_url)
+
+        def _send(req_headers):
+            return http_retry.request_with_retry(
+                lambda: client.request(req.get_method(),
+                                       req.get_full_url(),
+                                       data=data,
+                                       headers=req_headers,
+                                       timeout=timeout),
+                req.get_full_url(), req.get_method(), req_headers, retry_policy)
+
+        def _fetch():
+            if use_cache and req.get_method() == "GET":
+                return http_cache.cached_request(_send, req.get_full_url(), req.headers)
+            return _send(req.headers)
+
+        key = http_coalesce.request_key(req.get_method(), req.get_full_url(), req.headers, data, coalesce)
+        resp = _fetch() if key is None else http_coalesce.do(key, _fetch)
+        # 调用方自行条件请求时304为正常结果
+        if resp.status_code != 304 or not http_cache.is_conditional(req.headers):
             resp.raise_for_status()
+    except QtException:
+        raise
     except HTTPStatusError as err:
         raise QtException(QtError.E_OTHER_BASE, f"{url}:{err}")
     except Exception as err:
         raise QtException(QtError.E_CONNECT, f"{url}:{err}")
     content = resp.read()
-    frame_log.info("resp:{}", utils.utf8fmt(content))
+    frame_log.info("resp:{}", string_utils.utf8fmt(content))
     if decoder:
         try:
             content = decoder(content)
@@ -100,7 +136,7 @@ def cgi_request(url,
     if resp_header is not None:
         frame_log.info("headers:{}", resp.headers)
         resp_header.update(resp.headers)
-    return utils.utf8fmt(content)
+    return string_utils.utf8fmt(content)
 
 
 # pylint: disable=too-many-arguments, too-many-locals
@@ -112,76 +148,486 @@ async def async_cgi_request(url,
                             headers=None,
                             timeout=None,
                             resp_header=None,
+                            retry_policy=http_retry.NO_RETRY,
+                            use_cache=False,
+                            coalesce=False,
                             **para):
-    """公共cgi请求-异步"""
+    """公共cgi请求-异步, retry_policy、use_cache、coalesce同cgi_request"""
     req = build_cgi_request(url, req_method, data, headers, prepare, **para)
     if timeout is None:
         timeout = DEFAULT_REQUEST_TIMEOUT
     proxy_url = os.environ.get("http_proxy")
 
-    async with httpx.AsyncClient(proxies=proxy_url) as client:
-        resp = await client.request(
-            req.get_method(),
-            req.get_full_url(),
-            data=data,
-            headers=req.headers,
-            timeout=timeout,
-        )
-        content = resp.read()
-        frame_log.info("resp:{}", string_utils.utf8fmt(content))
-        if decoder:
-            try:
-                data = decoder(content)
-            except QtException:
-                raise
-            except Exception as err:
-                raise QtException(QtError.E_OTHER_BASE,
-                                  f"{url}: decoder resp error.({err})")
-        else:
-            data = content
-            if resp_header is not None:
-                frame_log.info("headers:{}", resp.headers)
-                resp_header.update(resp.headers)
-        return string_utils.utf8fmt(data)
+    # 按事件循环、host复用连接池中的keep-alive连接
+    client = http_pool.get_async_client(req.get_full_url(), proxy_url)
+
+    async def _send(req_headers):
+        return await http_retry.async_request_with_retry(
+            lambda: client.request(
+                req.get_method(),
+                req.get_full_url(),
+                data=data,
+                headers=req_headers,
+                timeout=timeout,
+            ),
+            req.get_full_url(), req.get_method(), req_headers, retry_policy)
+
+    async def _fetch():
+        if use_cache and req.get_method() == "GET":
+            return await http_cache.async_cached_request(_send, req.get_full_url(), req.headers)
+        return await _send(req.headers)
+
+    key = http_coalesce.request_key(req.get_method(), req.get_full_url(), req.headers, data, coalesce)
+    resp = await (_fetch() if key is None else http_coalesce.async_do(key, _fetch))
+    content = resp.read()
+    frame_log.info("resp:{}", string_utils.utf8fmt(content))
+    if decoder:
+        try:
+            data = decoder(content)
+        except QtException:
+            raise
+        except Exception as err:
+            raise QtException(QtError.E_OTHER_BASE,
+                              f"{url}: decoder resp error.({err})")
+    else:
+        data = content
+        if resp_header is not None:
+            frame_log.info("headers:{}", resp.headers)
+            resp_header.update(resp.headers)
+    return string_utils.utf8fmt(data)
+
+
+def _stream_error(url, err):
+    if isinstance(err, HTTPStatusError):
+        return QtException(QtError.E_OTHER_BASE, f"{url}:{err}")
+    return QtException(QtError.E_CONNECT, f"{url}:{err}")
+
+
+def cgi_stream(url,
+               req_method=None,
+               data=None,
+               prepare=None,
+               headers=None,
+               timeout=None,
+               chunk_size=STREAM_CHUNK_SIZE,
+               retry_policy=http_retry.NO_RETRY,
+               **para):
+    """公共cgi请求-同步流式读取，逐块返回响应体bytes
+
+    不读入完整响应体，日志只记录响应大小及耗时；提前退出迭代时关闭连接
+    >>> for record in jsonl_decoder(cgi_stream(url, "GET")):
+    ...     pass
+    """
+    req = build_cgi_request(url, req_method, data, headers, prepare, **para)
+    if timeout is None:
+        timeout = DEFAULT_REQUEST_TIMEOUT
+    start_time = default_timer()
+    client = http_pool.get_client(req.get_full_url(), os.environ.get("http_proxy"))
+    resp = None
+    try:
+        resp = http_retry.request_with_retry(
+            lambda: client.send(client.build_request(req.get_method(),
+                                                     req.get_full_url(),
+                                                     data=data,
+                                                     headers=req.headers,
+                                                     timeout=timeout),
+                                stream=True),
+            req.get_full_url(), req.get_method(), req.headers, retry_policy)
+        resp.raise_for_status()
+    except QtException:
+        raise
+    except Exception as err:
+        if resp is not None:
+            resp.close()
+        raise _stream_error(url, err)
+    nbytes = 0
+    try:
+        for chunk in resp.iter_bytes(chunk_size):
+            nbytes += len(chunk)
+            yield chunk
+    except Exception as err:
+        raise _stream_error(url, err)
+    finally:
+        resp.close()
+        frame_log.info("resp stream:{}|bytes:{}|elapsed:{:.3f}s", url, nbytes, default_timer() - start_time)
+
+
+async def async_cgi_stream(url,
+                           req_method=None,
+                           data=None,
+                           prepare=None,
+                           headers=None,
+                           timeout=None,
+                           chunk_size=STREAM_CHUNK_SIZE,
+                           retry_policy=http_retry.NO_RETRY,
+                           **para):
+    """公共cgi请求-异步流式读取，参数同cgi_stream"""
+    req = build_cgi_request(url, req_method, data, headers, prepare, **para)
+    if timeout is None:
+        timeout = DEFAULT_REQUEST_TIMEOUT
+    start_time = default_timer()
+    client = http_pool.get_async_client(req.get_full_url(), os.environ.get("http_proxy"))
+    resp = None
+    try:
+        resp = await http_retry.async_request_with_retry(
+            lambda: client.send(client.build_request(req.get_method(),
+                                                     req.get_full_url(),
+                                                     data=data,
+                                                     headers=req.headers,
+                                                     timeout=timeout),
+                                stream=True),
+            req.get_full_url(), req.get_method(), req.headers, retry_policy)
+        resp.raise_for_status()
+    except QtException:
+        raise
+    except Exception as err:
+        if resp is not None:
+            await resp.aclose()
+        raise _stream_error(url, err)
+    nbytes = 0
+    try:
+        async for chunk in resp.aiter_bytes(chunk_size):
+            nbytes += len(chunk)
+            yield chunk
+    except Exception as err:
+        raise _stream_error(url, err)
+    finally:
+        await resp.aclose()
+        frame_log.info("resp stream:{}|bytes:{}|elapsed:{:.3f}s", url, nbytes, default_timer() - start_time)
+
+
+def _open_dest(dest):
+    return open(dest, "wb") if isinstance(dest, (str, os.PathLike)) else None
+
+
+def cgi_download(url, dest, **kwargs):
+    """流式下载响应体到文件路径或可写的二进制文件对象(BytesIO等)，返回写入字节数
+
+    :param kwargs: 同cgi_stream
+    """
+    nbytes = 0
+    file = _open_dest(dest)
+    try:
+        for chunk in cgi_stream(url, **kwargs):
+            (file or dest).write(chunk)
+            nbytes += len(chunk)
+    finally:
+        if file is not None:
+            file.close()
+    return nbytes
+
+
+async def async_cgi_download(url, dest, **kwargs):
+    """cgi_download异步版本"""
+    nbytes = 0
+    file = _open_dest(dest)
+    try:
+        async for chunk in async_cgi_stream(url, **kwargs):
+            (file or dest).write(chunk)
+            nbytes += len(chunk)
+    finally:
+        if file is not None:
+            file.close()
+    return nbytes
+
+
+def iter_lines(chunks):
+    """bytes块按行切分，保留换行符"""
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+        yield from lines
+    if pending:
+        yield pending
+
+
+async def async_iter_lines(chunks):
+    """iter_lines异步版本"""
+    pending = b""
+    async for chunk in chunks:
+        lines = (pending + chunk).splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def jsonl_decoder(chunks):
+    """流式解析JSON Lines，逐行返回对象"""
+    for line in iter_lines(chunks):
+        if line.strip():
+            yield json.loads(line)
+
+
+async def async_jsonl_decoder(chunks):
+    """jsonl_decoder异步版本"""
+    async for line in async_iter_lines(chunks):
+        if line.strip():
+            yield json.loads(line)
+
+
+def csv_decoder(chunks, encoding="utf-8", **kwargs):
+    """流式解析CSV(首行为表头)，逐行返回dict，kwargs同csv.DictReader"""
+    return csv.DictReader((line.decode(encoding) for line in iter_lines(chunks)), **kwargs)
+
+
+def _batch_kwargs(spec, common):
+    """合并单项请求参数与公共参数，spec可为url或async_cgi_request参数dict"""
+    if isinstance(spec, str):
+        spec = {"url": spec}
+    kwargs = dict(common, **spec)
+    if kwargs.get("headers") is not None:
+        # build_cgi_request会写入X-Request-Id, 各请求使用独立的headers
+        kwargs["headers"] = dict(kwargs["headers"])
+    return kwargs
+
+
+async def _batch_request(index, kwargs, limit, host_limits):
+    url = kwargs["url"]
+    try:
+        # 先占host并发再占全局并发, 避免等待单个host时占用全局名额
+        async with host_limits[parse.urlsplit(url).netloc], limit:
+            result = await async_cgi_request(**kwargs)
+    except asyncio.CancelledError:
+        raise
+    except QtException as err:
+        frame_log.warning("cgi batch request:{}|error:{}", url, err)
+        return BatchResult(index, None, err)
+    except Exception as err:  # pylint: disable=broad-except
+        frame_log.warning("cgi batch request:{}|error:{}", url, err)
+        return BatchResult(index, None, QtException(QtError.E_CONNECT, f"{url}:{err}"))
+    return BatchResult(index, result, None)
+
+
+async def async_cgi_request_iter(specs,
+                                 concurrency=DEFAULT_BATCH_CONCURRENCY,
+                                 host_concurrency=DEFAULT_HOST_CONCURRENCY,
+                                 **kwargs):
+    """批量cgi请求-异步, 按完成顺序返回BatchResult
+
+    >>> async for item in async_cgi_request_iter([{"url": url, "id": 1}, url2], decoder=json.loads):
+    ...     if item.error is None:
+    ...         print(item.index, item.result)
+    :param specs: 请求列表, 每项为url或async_cgi_request的参数dict(须含url)
+    :param concurrency: 全局最大并发数
+    :param host_concurrency: 单个host最大并发数, None不限制
+    :param kwargs: 各请求公共参数(decoder、prepare、headers、timeout等), 单项参数优先
+    单项失败不中断批次, 异常记录在BatchResult.error; 提前退出迭代时取消未完成的请求
+    """
+    limit = asyncio.Semaphore(concurrency)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(host_concurrency or concurrency))
+    tasks = [
+        asyncio.ensure_future(_batch_request(idx, _batch_kwargs(spec, kwargs), limit, host_limits))
+        for idx, spec in enumerate(specs)
+    ]
+    try:
+        for future in asyncio.as_completed(tasks):
+            yield await future
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def async_cgi_batch(specs,
+                          concurrency=DEFAULT_BATCH_CONCURRENCY,
+                          host_concurrency=DEFAULT_HOST_CONCURRENCY,
+                          ordered=True,
+                          **kwargs):
+    """批量cgi请求-异步, 返回BatchResult列表
+
+    :param ordered: True按输入顺序返回, False按完成顺序返回
+    其余参数同async_cgi_request_iter
+    """
+    start_time = default_timer()
+    results = [
+        item async for item in async_cgi_request_iter(specs, concurrency, host_concurrency, **kwargs)
+    ]
+    if ordered:
+        results.sort(key=lambda item: item.index)
+    frame_log.info("cgi batch done:{}|errors:{}|elapsed:{:.3f}s", len(results),
+                   sum(item.error is not None for item in results), default_timer() - start_time)
+    return results
+
+
+def _cpp_decode(name, content, decoder):
+    """decoder序列化qtlib返回值"""
+    try:
+        return decoder(content)
+    except QtException:
+        raise
+    except Exception as err:
+        raise QtException(QtError.E_OTHER_BASE,
+                          f"{name}: decoder resp error.({err})")
+
+
+def _cpp_result(name, content, decoder):
+    """qtlib返回值处理: 无限值/nan转换为None, decoder序列化"""
+    # 无限值和nan值处理
+    if cpp_pool.invalid_result(content):
+        return None
+    # cpp计算结果序列化
+    if decoder:
+        frame_log.info("decoder:{} qtlib output result", decoder.__name__)
+        content = _cpp_decode(name, content, decoder)
+    frame_log.info(f"'{name} request successful, resp:{content}")
+    return content
 
 
 def cpp_request(func, *args, **kwargs):
     """c++模块统一调用函数
     :param func:c++接口函数名称， callable
+    :param timeout: 超时时间(秒)，默认cpp_pool.DEFAULT_CPP_TIMEOUT，超时抛出QtException(E_CONNECT)
+    :param executor: 执行方式，默认cpp_pool.CPP_EXECUTOR
+                     thread: 独立线程池执行，超时后不再等待(已开始的调用无法中断)
+                     process: 常驻子进程执行，超时结束子进程，func、参数及结果需可pickle
+                     inline: 当前线程执行，不支持超时
     :raise QtException
     """
     # 去除值为None的参数
-    timeout = kwargs.pop("timeout", 30)
+    timeout = kwargs.pop("timeout", cpp_pool.DEFAULT_CPP_TIMEOUT)
     decoder = kwargs.pop("decoder", lambda x: x)
+    executor = kwargs.pop("executor", None)
     name = func.__name__
-    start_time = default_timer()
+    frame_log.info("'qtlib:{}' request args:{}, kwargs:{}", name, args, kwargs)
     try:
-        while default_timer() - start_time <= timeout:
-            frame_log.info("'qtlib:{}' request args:{}, kwargs:{}", name, args,
-                           kwargs)
-            content = func(*args, **kwargs)
-            break
-        else:
-            raise TimeoutError(f"{name} requset timed out:{timeout}")
+        content = cpp_pool.run(func, args, kwargs, timeout, executor)
     except QtException:
         raise
     except Exception as err:
         raise QtException(QtError.E_CONNECT,
                           f"'qtlib.{name}' request error.({err})")
-    # 无限值和nan值处理
-    if isinstance(content, int) and math.isinf(content):
-        return None
-    if isinstance(content, float) and np.isnan(content):
+    return _cpp_result(name, content, decoder)
+
+
+async def async_cpp_request(func, *args, **kwargs):
+    """c++模块统一调用函数-异步，在执行池中运行不阻塞事件循环，参数同cpp_request"""
+    timeout = kwargs.pop("timeout", cpp_pool.DEFAULT_CPP_TIMEOUT)
+    decoder = kwargs.pop("decoder", lambda x: x)
+    executor = kwargs.pop("executor", None)
+    name = func.__name__
+    frame_log.info("'qtlib:{}' request args:{}, kwargs:{}", name, args, kwargs)
+    try:
+        content = await cpp_pool.async_run(func, args, kwargs, timeout, executor)
+    except QtException:
+        raise
+    except Exception as err:
+        raise QtException(QtError.E_CONNECT,
+                          f"'qtlib.{name}' request error.({err})")
+    return _cpp_result(name, content, decoder)
+
+
+def _cpp_batch_calls(arg_sets, columns, kwargs):
+    """批量参数转换为[(args, kwargs)]及结果索引"""
+    if isinstance(arg_sets, pd.DataFrame):
+        if columns:
+            rows = arg_sets[list(columns)].itertuples(index=False, name=None)
+            return [(row, kwargs) for row in rows], arg_sets.index
+        names = list(arg_sets.columns)
+        rows = arg_sets.itertuples(index=False, name=None)
+        return [((), dict(kwargs, **dict(zip(names, row)))) for row in rows], arg_sets.index
+    calls = []
+    for item in arg_sets:
+        if isinstance(item, dict):
+            calls.append(((), dict(kwargs, **item)))
+        else:
+            calls.append((tuple(item) if isinstance(item, (tuple, list)) else (item,), kwargs))
+    return calls, None
+
+
+def _cpp_memo_key(func, call):
+    """memo键包含func本身(键持有其引用)，多个接口共用memo时互不命中"""
+    args, kwargs = call
+    key = (func, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
         return None
-    # cpp计算结果序列化
-    if decoder:
+    return key
+
+
+def cpp_batch_request(func, arg_sets, columns=None, chunksize=CPP_BATCH_CHUNKSIZE, workers=None,
+                      executor=None, timeout=None, decoder=None, memo=True, **kwargs) -> pd.DataFrame:
+    """c++模块批量调用函数，结果与输入逐行对齐
+
+    >>> result = cpp_batch_request(qtlib.bond_pricer, positions, columns=["code", "yield"], curve=curve)
+    :param func: c++接口函数， callable
+    :param arg_sets: DataFrame(按columns取位置参数，未指定columns时列名作为关键字参数)，
+                     或参数列表(每项为位置参数tuple/list、关键字参数dict或单个参数)
+    :param chunksize: 每块行数(>=1)，按块提交到执行池并行执行
+    :param workers: 同时提交的块数，默认执行池max_workers
+    :param executor: 执行方式，同cpp_request；process模式func及参数需可pickle
+    :param timeout: 单块超时时间(秒)，默认不限制，超时时块内各行均记为失败
+    :param decoder: 逐行序列化结果
+    :param memo: 相同输入(可hash)只计算一次；传入dict时在多个批次间复用
+    :param kwargs: 各行公共关键字参数
+    :return: DataFrame[result, error]，index与输入DataFrame一致，error为None或QtException
+    """
+    if chunksize < 1:
+        raise ValueError(f"illegal chunksize:{chunksize}")
+    if workers is not None and workers < 1:
+        raise ValueError(f"illegal workers:{workers}")
+    executor = executor or cpp_pool.CPP_EXECUTOR
+    if executor not in cpp_pool.EXECUTORS:
+        raise ValueError(f"illegal executor:{executor}")
+    name = func.__name__
+    start_time = default_timer()
+    calls, index = _cpp_batch_calls(arg_sets, columns, kwargs)
+    memo = memo if isinstance(memo, dict) else ({} if memo else None)
+    keys = [_cpp_memo_key(func, call) if memo is not None else None for call in calls]
+    # 待计算的调用: 去除已缓存及批次内重复的输入
+    pending, pending_keys = [], {}
+    for pos, (call, key) in enumerate(zip(calls, keys)):
+        if key is None:
+            pending.append(pos)
+        elif key not in memo and key not in pending_keys:
+            pending_keys[key] = pos
+            pending.append(pos)
+    chunks = [pending[idx:idx + chunksize] for idx in range(0, len(pending), chunksize)]
+    outputs = [None] * len(calls)
+
+    pool = cpp_pool.CPP_POOL
+    # process模式超时在子进程调用内处理，thread模式等待结果时计时
+    wait_timeout = None if executor == "process" else timeout
+    computed = {}  # 本批次按key计算的结果
+
+    def _collect(chunk, future):
+        """写回块内各行结果，块级失败(超时等)不缓存"""
         try:
-            frame_log.info("decoder:{} qtlib output result", decoder.__name__)
-            content = decoder(content)
-        except QtException:
-            raise
-        except Exception as err:
-            raise QtException(QtError.E_OTHER_BASE,
-                              f"{name}: decoder resp error.({err})")
-    frame_log.info(f"'{name} request successful, resp:{content}")
-    return content
+            results, cacheable = pool.result(future, func, wait_timeout), True
+        except Exception as err:  # pylint: disable=broad-except
+            error = QtException(QtError.E_CONNECT, f"'qtlib.{name}' request error.({err})")
+            results, cacheable = [(False, error)] * len(chunk), False
+        for pos, output in zip(chunk, results):
+            outputs[pos] = output
+            if keys[pos] is not None:
+                computed[keys[pos]] = output
+                if cacheable:
+                    memo[keys[pos]] = output
+
+    # 同时提交不超过workers块，保证thread模式各块自开始执行起计时
+    running = deque()
+    for chunk in chunks:
+        if len(running) >= (workers or pool.max_workers):
+            _collect(*running.popleft())
+        running.append((chunk, pool.submit(cpp_pool.run_chunk, (func, [calls[pos] for pos in chunk]),
+                                           timeout=timeout, executor=executor)))
+    while running:
+        _collect(*running.popleft())
+    values, errors = [], []
+    for pos, key in enumerate(keys):
+        succeed, value = outputs[pos] or computed.get(key) or memo[key]
+        if succeed and cpp_pool.invalid_result(value):
+            value = None
+        elif succeed and decoder:
+            try:
+                value = _cpp_decode(name, value, decoder)
+            except QtException as err:
+                succeed, value = False, err
+        values.append(value if succeed else None)
+        errors.append(None if succeed else value)
+    frame_log.info("'qtlib:{}' batch rows:{}|computed:{}|chunks:{}|errors:{}|elapsed:{:.3f}s",
+                   name, len(calls), len(pending), len(chunks), sum(error is not None for error in errors),
+                   default_timer() - start_time)
+    return pd.DataFrame({"result": values, "error": errors}, index=index)
@@ -1,5 +1,6 @@
 # vim set fileencoding=utf-8
 """配置管理模块"""
+import threading
 from configparser import RawConfigParser
 from functools import lru_cache
 
@@ -9,6 +10,8 @@ from common.qt_logging import frame_log
 from common.utils import MultiModeBase
 
 
+_INITIALIZING = threading.local()  # 当前线程正在执行handler的配置实例
+
 
 class ConfigManager(MultiModeBase):
     _HANDLERS = []
@@ -34,8 +37,12 @@ class ConfigManager(MultiModeBase):
                 handler(cls(mode_name))
 
     def initialize(self, *args, **kwargs):
-        for handler in self._HANDLERS:
-            handler(self)
+        _INITIALIZING.instance = self
+        try:
+            for handler in self._HANDLERS:
+                handler(self)
+        finally:
+            _INITIALIZING.instance = None
 
 
 class INIConfigManager(ConfigManager):
@@ -94,8 +101,24 @@ class CommonConfig(BaseSettings):
         return run_env
 
 
+_LOAD_LOCK = threading.RLock()
+
+
+def load_config():
+    """按需加载配置(CommonConfig, 读取环境变量CONF指定的配置文件)，已加载时直接返回"""
+    initializing = getattr(_INITIALIZING, "instance", None)
+    if initializing is not None:
+        # 配置handler中重入(如get_config、DBManager.get_instance)，返回初始化中的配置
+        return initializing
+    if not ConfigManager():
+        with _LOAD_LOCK:
+            if not ConfigManager():
+                CommonConfig()
+    return ConfigManager()
+
+
 def get_config(section, *keys, **kwargs):
-    return ConfigManager().get(section, *keys, **kwargs)
+    return load_config().get(section, *keys, **kwargs)
 
 
 def get_settings(settings):
@@ -0,0 +1,298 @@
+# vim set fileencoding=utf-8
+"""qtlib调用执行池模块"""
+import asyncio
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+from asyncio.futures import wrap_future
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from common import async_helper
+from common.error import QtError, QtException
+from common.qt_logging import frame_log
+
+DEFAULT_CPP_TIMEOUT = 30  # qtlib调用默认超时时间(秒)
+CPP_MAX_WORKERS = int(os.environ.get("CPP_MAX_WORKERS", os.cpu_count() or 1))  # 线程池/进程池最大并发
+CPP_EXECUTOR = os.environ.get("CPP_EXECUTOR", "thread")  # 默认执行方式: thread/process/inline
+CPP_START_METHOD = os.environ.get("CPP_START_METHOD", "spawn")  # 子进程启动方式
+EXECUTORS = ("thread", "process", "inline")
+
+
+def invalid_result(content) -> bool:
+    """是否为无限值或nan值"""
+    return isinstance(content, (int, float)) and (math.isinf(content) or math.isnan(content))
+
+
+def run_chunk(func, calls):
+    """批量执行一组调用(不逐条记录日志)，返回[(是否成功, 结果或QtException)]
+
+    :param calls: [(args, kwargs)]
+    """
+    results = []
+    for args, kwargs in calls:
+        try:
+            results.append((True, func(*args, **kwargs)))
+        except QtException as err:
+            results.append((False, err))
+        except Exception as err:  # pylint: disable=broad-except
+            results.append((False, QtException(QtError.E_CONNECT,
+                                               f"'qtlib.{func.__name__}' request error.({err})")))
+    return results
+
+
+def _worker_main(conn):
+    """子进程: 循环接收(func, args, kwargs)并返回(是否成功, 结果或异常)"""
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        func, args, kwargs = task
+        try:
+            result = (True, func(*args, **kwargs))
+        except Exception as err:  # pylint: disable=broad-except
+            result = (False, err)
+        try:
+            conn.send(result)
+        except Exception as err:  # pylint: disable=broad-except
+            # 结果或异常无法pickle
+            conn.send((False, RuntimeError(f"{func.__name__} result pickle error:{err}")))
+
+
+class _ProcessWorker(object):
+    """单个常驻子进程，超时或取消时直接结束进程"""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.broken = False  # 超时或子进程退出后不可复用
+
+    def call(self, func, args, kwargs, timeout):
+        self.conn.send((func, args, kwargs))
+        if not self.conn.poll(timeout):
+            self.broken = True
+            raise TimeoutError(f"{func.__name__} request timed out:{timeout}")
+        try:
+            succeed, value = self.conn.recv()
+        except (EOFError, OSError) as err:
+            self.broken = True
+            raise RuntimeError(f"{func.__name__} worker exited:{self.process.exitcode}") from err
+        if succeed:
+            return value
+        raise value
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class CppExecutor(object):
+    """qtlib调用执行器
+
+    thread: 在独立线程池中执行，超时后调用方不再等待，但已开始执行的调用无法中断(计入abandoned)
+    process: 在常驻子进程中执行，超时或取消时结束该子进程并按需重建；func、参数及结果需可pickle
+    inline: 在当前线程执行，不支持超时(兼容原调用方式)
+    """
+
+    def __init__(self, max_workers=CPP_MAX_WORKERS, start_method=CPP_START_METHOD):
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self.calls = 0
+        self.timeouts = 0
+        self.abandoned = 0  # 线程模式下超时仍在执行的调用数
+        self.killed = 0  # 进程模式下被结束的子进程数
+        self._threads = None
+        self._workers = []  # 空闲子进程
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._threads = None
+            self._workers = []
+            self._slots = threading.BoundedSemaphore(self.max_workers)
+            self._pid = os.getpid()
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            self._check_fork()
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cpp")
+            return self._threads
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def _process_call(self, func, args, kwargs, timeout, handle=None):
+        """占用一个子进程执行，handle用于异步取消时获取当前子进程"""
+        with self._lock:
+            self._check_fork()
+            slots = self._slots
+        slots.acquire()  # pylint: disable=consider-using-with
+        worker = None
+        try:
+            with self._lock:
+                worker = self._workers.pop() if self._workers else None
+            if worker is not None and not worker.process.is_alive():
+                worker.kill()
+                worker = None
+            if worker is None:
+                worker = _ProcessWorker(multiprocessing.get_context(self.start_method))
+            if handle is not None:
+                handle.append(worker)
+            result = worker.call(func, args, kwargs, timeout)
+        except BaseException as err:
+            if worker is not None:
+                if worker.broken or not isinstance(err, Exception):
+                    self._kill(worker, func, err)
+                else:
+                    self._release(worker)
+            raise
+        finally:
+            slots.release()
+        self._release(worker)
+        return result
+
+    def _kill(self, worker, func, err):
+        frame_log.warning("cpp worker killed:{}|{}", func.__name__, err)
+        worker.kill()
+        with self._lock:
+            self.killed += 1
+            if isinstance(err, TimeoutError):
+                self.timeouts += 1
+
+    def _release(self, worker):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._workers.append(worker)
+
+    def run(self, func, args=(), kwargs=None, timeout=DEFAULT_CPP_TIMEOUT, executor=None):
+        """执行func(*args, **kwargs)，超时抛出TimeoutError"""
+        executor = executor or CPP_EXECUTOR
+        kwargs = kwargs or {}
+        self._count()
+        if executor == "inline":
+            return func(*args, **kwargs)
+        if executor == "process":
+            return self._process_call(func, args, kwargs, timeout)
+        if executor != "thread":
+            raise ValueError(f"illegal executor:{executor}")
+        future = self._thread_pool().submit(func, *args, **kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self._abandon(future)
+            raise TimeoutError(f"{func.__name__} request timed out:{timeout}") from None
+
+    def submit(self, func, args=(), kwargs=None, timeout=DEFAULT_CPP_TIMEOUT, executor=None) -> Future:
+        """提交func(*args, **kwargs)，返回Future，由result等待结果
+
+        process模式超时在子进程调用内处理(Future抛出TimeoutError)，thread模式超时由result处理，inline模式立即执行
+        """
+        executor = executor or CPP_EXECUTOR
+        kwargs = kwargs or {}
+        if executor not in EXECUTORS:
+            raise ValueError(f"illegal executor:{executor}")
+        self._count()
+        if executor == "process":
+            return self._thread_pool().submit(self._process_call, func, args, kwargs, timeout)
+        if executor == "thread":
+            return self._thread_pool().submit(func, *args, **kwargs)
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as err:  # pylint: disable=broad-except
+            future.set_exception(err)
+        return future
+
+    def result(self, future, func, timeout=DEFAULT_CPP_TIMEOUT):
+        """等待submit返回的Future，超时抛出TimeoutError"""
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self._abandon(future)
+            raise TimeoutError(f"{func.__name__} request timed out:{timeout}") from None
+
+    async def async_run(self, func, args=(), kwargs=None, timeout=DEFAULT_CPP_TIMEOUT, executor=None):
+        """run的异步版本，等待期间不阻塞事件循环；协程取消时未开始的调用取消，进程模式结束子进程"""
+        executor = executor or CPP_EXECUTOR
+        kwargs = kwargs or {}
+        if executor == "inline":
+            self._count()
+            return func(*args, **kwargs)
+        if executor == "process":
+            self._count()
+            handle = []
+            try:
+                return await async_helper.run_sync(self._process_call, func, args, kwargs, timeout, handle)
+            except asyncio.CancelledError:
+                if handle:
+                    handle[0].process.kill()  # 等待中的线程随即收到EOF并回收该子进程
+                raise
+        if executor != "thread":
+            raise ValueError(f"illegal executor:{executor}")
+        self._count()
+        future = self._thread_pool().submit(func, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.shield(wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            raise TimeoutError(f"{func.__name__} request timed out:{timeout}") from None
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def _abandon(self, future):
+        cancelled = future.cancel()
+        with self._lock:
+            self.timeouts += 1
+            self.abandoned += not cancelled
+        if not cancelled:
+            frame_log.warning("cpp call still running after timeout, abandoned:{}", self.abandoned)
+
+    def shutdown(self):
+        with self._lock:
+            threads, self._threads = self._threads, None
+            workers, self._workers = self._workers, []
+        if threads is not None:
+            threads.shutdown(wait=False, cancel_futures=True)
+        for worker in workers:
+            worker.kill()
+
+    def stats(self):
+        with self._lock:
+            return dict(calls=self.calls, timeouts=self.timeouts, abandoned=self.abandoned,
+                        killed=self.killed, idle_workers=len(self._workers))
+
+
+CPP_POOL = CppExecutor()
+atexit.register(CPP_POOL.shutdown)
+
+
+def configure(max_workers=CPP_MAX_WORKERS, start_method=CPP_START_METHOD):
+    """重新创建执行池"""
+    global CPP_POOL  # pylint: disable=global-statement
+    CPP_POOL.shutdown()
+    CPP_POOL = CppExecutor(max_workers, start_method)
+
+
+def run(func, args=(), kwargs=None, timeout=DEFAULT_CPP_TIMEOUT, executor=None):
+    return CPP_POOL.run(func, args, kwargs, timeout, executor)
+
+
+async def async_run(func, args=(), kwargs=None, timeout=DEFAULT_CPP_TIMEOUT, executor=None):
+    return await CPP_POOL.async_run(func, args, kwargs, timeout, executor)
+
+
+def stats():
+    return CPP_POOL.stats()
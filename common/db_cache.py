@@ -0,0 +1,328 @@
+# vim set fileencoding=utf-8
+"""db查询结果缓存模块"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import pandas as pd
+
+from common.qt_logging import frame_log
+from common.utilities import string_utils
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DEFAULT_TTL = 300  # 默认过期时间(秒)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 默认内存上限
+DEFAULT_DISK_TTL = 24 * 60 * 60  # 磁盘缓存默认过期时间(秒)
+DEFAULT_DISK_MAX_BYTES = 10 * 1024 * 1024 * 1024  # 磁盘缓存默认容量上限
+DEFAULT_DISK_PATH = os.environ.get("QT_RESULT_CACHE_DIR",
+                                   os.path.join(tempfile.gettempdir(), "qt_result_cache"))
+
+
+def norm_table_name(name: str) -> str:
+    """表名归一化: 去除schema、引号并转小写"""
+    return name.rsplit(".", 1)[-1].strip('"`[]').lower()
+
+
+class ResultCache(object):
+    """pd_read_sql结果缓存(进程内)
+
+    按(engine, sql, 参数)缓存DataFrame，支持TTL、内存上限(LRU淘汰)及按表名失效
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        assert ttl > 0 and max_bytes > 0
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expire, nbytes, tables, df)
+        self._tables = defaultdict(set)  # table -> keys
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """命中返回DataFrame副本，否则返回None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    self._pop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[3].copy()
+
+    def set(self, key, data: pd.DataFrame, tables=(), ttl=None):
+        nbytes = int(data.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            frame_log.info("result too large to cache:{} bytes", nbytes)
+            return
+        tables = {norm_table_name(table) for table in tables}
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            while self._data and self.nbytes + nbytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+            expire = time.monotonic() + (ttl or self.ttl)
+            self._data[key] = (expire, nbytes, tables, data.copy())
+            self.nbytes += nbytes
+            for table in tables:
+                self._tables[table].add(key)
+
+    def invalidate(self, *tables):
+        """按表名失效引用该表的缓存"""
+        with self._lock:
+            for table in tables:
+                for key in self._tables.pop(norm_table_name(table), set()):
+                    self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tables.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(entries=len(self._data), nbytes=self.nbytes,
+                        hits=self.hits, misses=self.misses)
+
+    def _pop(self, key):
+        _, nbytes, tables, _ = self._data.pop(key)
+        self.nbytes -= nbytes
+        for table in tables:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+
+RESULT_CACHE = ResultCache()
+
+
+class DiskResultCache(object):
+    """pd_read_sql结果磁盘缓存(跨进程持久化)
+
+    每条结果保存为<key hash>.feather(未压缩Arrow IPC，读取时内存映射)或.parquet，
+    及同名.json元数据(过期时间、大小、涉及表名)；按文件修改时间(命中时更新)LRU淘汰
+    feather读取返回的DataFrame与映射文件共享只读内存，原地修改前需copy()
+    """
+    FORMATS = ("feather", "parquet")
+
+    def __init__(self, path=DEFAULT_DISK_PATH, ttl=DEFAULT_DISK_TTL,
+                 max_bytes=DEFAULT_DISK_MAX_BYTES, fmt="feather"):
+        if pyarrow is None:
+            raise RuntimeError("disk result cache need pyarrow")
+        assert ttl > 0 and max_bytes > 0 and fmt in self.FORMATS
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.hits = 0
+        self.misses = 0
+        self._index = {}  # name -> (expire, nbytes, tables)
+        self._index_mtime = None
+        self._lock = threading.RLock()
+        # 缓存内容为查询结果，目录及文件仅当前用户可访问
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        stat = os.stat(path)
+        if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+            raise RuntimeError(f"disk cache path:{path} not owned by current user")
+        if stat.st_mode & 0o077:
+            os.chmod(path, 0o700)
+
+    @staticmethod
+    def entry_name(key) -> str:
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def _data_path(self, name):
+        return os.path.join(self.path, f"{name}.{self.fmt}")
+
+    def _meta_path(self, name):
+        return os.path.join(self.path, f"{name}.json")
+
+    def _refresh_index(self):
+        """目录有变更(含其他进程写入、删除)时重新加载元数据"""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._index_mtime:
+            return
+        index = {}
+        for file_name in os.listdir(self.path):
+            name, ext = os.path.splitext(file_name)
+            if ext != ".json":
+                continue
+            if name in self._index:
+                index[name] = self._index[name]
+                continue
+            try:
+                with open(os.path.join(self.path, file_name), encoding="utf-8") as file:
+                    meta = json.load(file)
+                index[name] = (meta["expire"], meta["nbytes"], set(meta["tables"]))
+            except (OSError, ValueError, KeyError):
+                continue
+        self._index, self._index_mtime = index, mtime
+
+    def get(self, key):
+        """命中返回DataFrame，否则返回None"""
+        name = self.entry_name(key)
+        with self._lock:
+            self._refresh_index()
+            item = self._index.get(name)
+            if item is None or item[0] < time.time():
+                if item is not None:
+                    self._remove(name)
+                self.misses += 1
+                return None
+            path = self._data_path(name)
+            try:
+                if self.fmt == "feather":
+                    table = pyarrow.feather.read_table(path, memory_map=True)
+                else:
+                    table = pyarrow.parquet.read_table(path, memory_map=True)
+                os.utime(path)
+            except (OSError, pyarrow.ArrowException) as e:
+                frame_log.warning("read disk cache failed:{}|{}", path, e)
+                self._remove(name)
+                self.misses += 1
+                return None
+            self.hits += 1
+        return table.to_pandas(split_blocks=True)
+
+    def set(self, key, data: pd.DataFrame, tables=(), ttl=None):
+        name = self.entry_name(key)
+        path = self._data_path(name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if self.fmt == "feather":
+                pyarrow.feather.write_feather(data, tmp_path, compression="uncompressed")
+            else:
+                pyarrow.parquet.write_table(pyarrow.Table.from_pandas(data), tmp_path)
+        except (pyarrow.ArrowException, TypeError, ValueError) as e:
+            frame_log.warning("result can not save to disk cache:{}", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        nbytes = os.path.getsize(tmp_path)
+        if nbytes > self.max_bytes:
+            frame_log.info("result too large to cache:{} bytes", nbytes)
+            os.remove(tmp_path)
+            return
+        tables = sorted({norm_table_name(table) for table in tables})
+        meta = {"expire": time.time() + (ttl or self.ttl), "nbytes": nbytes, "tables": tables}
+        os.chmod(tmp_path, 0o600)
+        with self._lock:
+            self._refresh_index()
+            self._evict(self.max_bytes - nbytes, exclude=name)
+            os.replace(tmp_path, path)
+            meta_fd = os.open(f"{self._meta_path(name)}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(meta_fd, "w", encoding="utf-8") as file:
+                json.dump(meta, file)
+            os.replace(f"{self._meta_path(name)}.tmp", self._meta_path(name))
+            self._index[name] = (meta["expire"], nbytes, set(tables))
+
+    def _evict(self, limit, exclude=None):
+        """删除过期条目，并按最近访问时间淘汰至总大小不超过limit"""
+        now = time.time()
+        for name in [name for name, item in self._index.items() if item[0] < now]:
+            self._remove(name)
+        total = sum(item[1] for name, item in self._index.items() if name != exclude)
+        if total <= limit:
+            return
+
+        def _atime(name):
+            try:
+                return os.stat(self._data_path(name)).st_mtime
+            except OSError:
+                return 0
+
+        for name in sorted((name for name in self._index if name != exclude), key=_atime):
+            if total <= limit:
+                break
+            total -= self._index[name][1]
+            self._remove(name)
+
+    def _remove(self, name):
+        self._index.pop(name, None)
+        for path in (self._meta_path(name), self._data_path(name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, *tables):
+        """按表名失效引用该表的缓存"""
+        tables = {norm_table_name(table) for table in tables}
+        with self._lock:
+            self._refresh_index()
+            for name in [name for name, item in self._index.items() if item[2] & tables]:
+                self._remove(name)
+
+    def clear(self):
+        with self._lock:
+            self._refresh_index()
+            for name in list(self._index):
+                self._remove(name)
+
+    def stats(self):
+        with self._lock:
+            self._refresh_index()
+            return dict(entries=len(self._index), nbytes=sum(item[1] for item in self._index.values()),
+                        hits=self.hits, misses=self.misses)
+
+
+_DISK_CACHE = None
+
+
+def disk_cache() -> DiskResultCache:
+    """全局磁盘缓存，首次使用时按默认参数创建"""
+    global _DISK_CACHE  # pylint: disable=global-statement
+    if _DISK_CACHE is None:
+        _DISK_CACHE = DiskResultCache()
+    return _DISK_CACHE
+
+
+def configure_disk_cache(path=DEFAULT_DISK_PATH, ttl=DEFAULT_DISK_TTL,
+                         max_bytes=DEFAULT_DISK_MAX_BYTES, fmt="feather"):
+    """设置全局磁盘缓存参数(目录中已有的缓存保留)"""
+    global _DISK_CACHE  # pylint: disable=global-statement
+    _DISK_CACHE = DiskResultCache(path, ttl, max_bytes, fmt)
+    return _DISK_CACHE
+
+
+def configure_result_cache(ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+    """重新设置全局结果缓存参数(清空已有缓存)"""
+    assert ttl > 0 and max_bytes > 0
+    RESULT_CACHE.clear()
+    RESULT_CACHE.ttl = ttl
+    RESULT_CACHE.max_bytes = max_bytes
+
+
+def result_cache_key(bind, sql, kwargs) -> tuple:
+    """缓存key: engine连接串(不含密码)、sql文本、pandas.read_sql参数(含绑定参数)"""
+    if not isinstance(sql, str):
+        # sqlalchemy statement: 编译为sql文本及绑定参数
+        compiled = sql.compile(dialect=bind.dialect)
+        sql, kwargs = compiled.string, dict(kwargs, params=compiled.params)
+    return bind.url.render_as_string(hide_password=True), sql, repr(sorted(kwargs.items()))
+
+
+def sql_tables(sql) -> set:
+    return {norm_table_name(table) for table in string_utils.get_tbnames_from_sql(str(sql))}
+
+
+def invalidate_tables(*tables):
+    RESULT_CACHE.invalidate(*tables)
+    if _DISK_CACHE is not None:
+        _DISK_CACHE.invalidate(*tables)
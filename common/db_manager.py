@@ -3,27 +3,46 @@
 """DB管理模块"""
 
 import datetime
+import functools
 import inspect
+import io
+import itertools
 import json
+import os
+import tempfile
+import threading
 import time
 import typing
-from collections import namedtuple
-from contextlib import contextmanager
+import weakref
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager, contextmanager
 from typing import Union
 from urllib.parse import quote_plus
 
+import numpy
 import pandas
 import pandas as pd
+import sqlalchemy
 import sqlalchemy.orm
-from sqlalchemy import create_engine, inspect as sql_inspect
+from dateutil import tz
+from sqlalchemy import create_engine, event, inspect as sql_inspect
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.dialects.postgresql.base import PGDialect
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session, load_only, Query
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql.expression import insert
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import ClauseElement
+from sqlalchemy.sql.expression import Select, insert
+from sqlalchemy.sql.traversals import InternalTraversal
 
-from qt_quant.common import config
+from qt_quant.common import config, db_cache, db_fetch, db_pool, db_profiler
 from qt_quant.common.qt_logging import frame_log
 
 PGDialect._get_server_version_info = lambda *args: (9, 2)  # 解决引入pg插件后版本强制检测的问题
@@ -38,12 +57,163 @@ PgDBCfg = namedtuple(
 Base = declarative_base()
 
 
+# pd_to_sql写入结果
+WriteResult = namedtuple("WriteResult", ["inserted", "updated"])
+
+
+# batch_insert写入结果: 提交行数、影响行数(同原返回值ResultProxy.rowcount)及每块统计
+BatchInsertResult = namedtuple("BatchInsertResult", ["rows", "rowcount", "chunks"])
+
+
+# batch_insert每块统计: 序号、提交行数、影响行数(如IGNORE跳过的行不计入)、耗时
+ChunkStat = namedtuple("ChunkStat", ["index", "rows", "rowcount", "elapsed"])
+
+
+INSERT_CHUNKSIZE = 1000  # batch_insert单块行数
+BULK_CHUNKSIZE = 100000  # 批量导入单块行数
+UPSERT_CHUNKSIZE = 1000  # upsert单条语句行数(受数据库绑定参数个数限制)
+
+
 class DBManager(object):
     _INSTANCES = {}
     MYSQL_PREFIX = "mysql_"
     POSTGRESQL_PREFIX = "pg_"
 
+    REPLICA_ROUND_ROBIN = "round_robin"
+    REPLICA_LEAST_CONNECTIONS = "least_connections"
+
     def __init__(self, name, db_cfg):
+        engine_paras = {
+            "pool_recycle": 3600,
+            "poolclass": db_pool.InstrumentedQueuePool,  # 记录连接池checkout耗时、超时等
+            "echo": False,  # 是否开启sql日志
+            "case_sensitive": False  # 忽略列大小写
+        }
+        engine_paras.update(db_pool.default_pool_paras())  # 按worker、线程数推导
+        engine_paras.update(db_cfg.engine_para)
+        for key in ("pool_size", "max_overflow", "pool_recycle"):
+            engine_paras[key] = int(engine_paras[key])
+        # 自适应调整溢出连接数: pool_adaptive = true
+        pool_adaptive = str(engine_paras.pop("pool_adaptive", False)).lower() in ("1", "true", "yes")
+        if engine_paras["poolclass"] is db_pool.InstrumentedQueuePool:
+            engine_paras["pool_adaptive"] = pool_adaptive
+        # 从库配置: replica_hosts = host1:port1,host2 (缺省端口同主库)
+        self._replica_hosts = engine_paras.pop("replica_hosts", None)
+        self.replica_policy = engine_paras.pop("replica_policy", self.REPLICA_ROUND_ROBIN)
+        if self.replica_policy not in (self.REPLICA_ROUND_ROBIN, self.REPLICA_LEAST_CONNECTIONS):
+            raise RuntimeError(f"unsupport replica_policy:{self.replica_policy}")
+        self._engine_paras = engine_paras
+        self.db_cfg = db_cfg
+        self.name = name
+        # engine、session工厂在首次使用时创建
+        self._engine = None
+        self._replicas = None
+        self._session = None
+        self._setup_lock = threading.Lock()
+        self._replica_cycle = None
+        self._replica_lock = threading.Lock()
+
+    def _setup(self):
+        if self._session is None:
+            with self._setup_lock:
+                if self._session is None:
+                    self._engine = self._create_engine(self.engine_url(self.name, self.db_cfg),
+                                                       self._engine_paras)
+                    replicas = []
+                    for replica in (self._replica_hosts or "").split(","):
+                        if not replica.strip():
+                            continue
+                        host, _, port = replica.strip().partition(":")
+                        replica_cfg = self.db_cfg._replace(
+                            host=host, port=int(port) if port else self.db_cfg.port)
+                        replicas.append(self._create_engine(self.engine_url(self.name, replica_cfg),
+                                                            self._engine_paras))
+                    self._replicas = replicas
+                    self._replica_cycle = itertools.cycle(replicas)
+                    self._session = scoped_session(
+                        sessionmaker(bind=self._engine, class_=RoutingSession, db_manager=self))
+                    if db_profiler.PROFILER.enabled:
+                        self._profile_engines()
+                    frame_log.info("db:{} engine created|replicas:{}", self.name, len(replicas))
+        return self
+
+    def _profile_engines(self):
+        db_profiler.PROFILER.attach(self._engine, self.name)
+        for replica in self._replicas:
+            db_profiler.PROFILER.attach(replica, f"{self.name}@{replica.url.host}")
+
+    @staticmethod
+    def enable_profiler(slow_threshold=db_profiler.DEFAULT_SLOW_THRESHOLD):
+        """开启sql性能分析(含已创建及后续创建的engine)，统计见db_profiler.PROFILER.stats()
+
+        :param slow_threshold: 慢查询阈值(秒)，超过时输出完整sql及request id
+        """
+        db_profiler.PROFILER.slow_threshold = slow_threshold
+        db_profiler.PROFILER.enabled = True
+        for instance in DBManager._INSTANCES.values():
+            if instance.initialized:
+                instance._profile_engines()  # pylint: disable=protected-access
+
+    @staticmethod
+    def disable_profiler():
+        db_profiler.PROFILER.enabled = False
+        db_profiler.PROFILER.detach_all()
+
+    @property
+    def initialized(self):
+        """engine是否已创建"""
+        return self._session is not None
+
+    @property
+    def engine(self):
+        return self._setup()._engine
+
+    @property
+    def replicas(self):
+        return self._setup()._replicas
+
+    @property
+    def session(self):
+        return self._setup()._session
+
+    @staticmethod
+    def _create_engine(url, engine_paras):
+        if engine_paras.get("poolclass") is db_pool.InstrumentedQueuePool:
+            engine_paras = dict(engine_paras, pool_stats=db_pool.PoolStats())
+        return db_pool.instrument_engine(create_engine(url, **engine_paras))
+
+    def pool_stats(self):
+        """连接池统计: checkout次数/等待耗时、超时次数、占用及溢出连接数、连接存活时长"""
+        stats = self._engine_pool_stats(self.engine)
+        if self.replicas:
+            stats["replicas"] = [self._engine_pool_stats(engine) for engine in self.replicas]
+        return stats
+
+    @staticmethod
+    def _engine_pool_stats(engine):
+        pool_stats = getattr(engine.pool, "pool_stats", None)
+        if pool_stats is None:
+            return {"status": engine.pool.status()}
+        return pool_stats.snapshot(engine.pool)
+
+    @staticmethod
+    def all_pool_stats():
+        """所有已创建engine的DBManager的连接池统计 {name: stats}"""
+        return {name: instance.pool_stats() for name, instance in DBManager._INSTANCES.items()
+                if instance.initialized}
+
+    def get_read_engine(self):
+        """按replica_policy选择从库engine，未配置从库时返回主库"""
+        if not self.replicas:
+            return self.engine
+        if self.replica_policy == self.REPLICA_LEAST_CONNECTIONS:
+            return min(self.replicas, key=lambda engine: getattr(engine.pool, "checkedout", int)())
+        with self._replica_lock:
+            return next(self._replica_cycle)
+
+    @classmethod
+    def engine_url(cls, name, db_cfg):
+        """根据db配置拼接engine连接串"""
         create_eng_str = (
             "{engine}://{user}:{passwd}@{host}:{port}/{db}".format(
                 engine=db_cfg.engine,
@@ -54,22 +224,15 @@ class DBManager(object):
                 db=db_cfg.db_name,
             )
         )
-        if name.startswith(self.MYSQL_PREFIX):
+        if name.startswith(cls.MYSQL_PREFIX):
             create_eng_str += "?charset={}".format(db_cfg.charset)
-        engine_paras = {
-            "pool_size": 512,
-            "max_overflow": 512,
-            "pool_recycle": 3600,
-            "echo": False,  # 是否开启sql日志
-            "case_sensitive": False  # 忽略列大小写
-        }
-        engine_paras.update(db_cfg.engine_para)
-        self.engine = create_engine(create_eng_str, **engine_paras)
-        self.session = scoped_session(sessionmaker(bind=self.engine))
-        self.name = name
+        return create_eng_str
 
     @staticmethod
     def get_instance(name):
+        if name not in DBManager._INSTANCES:
+            # 首次使用时加载配置，由db_config_handle完成注册
+            config.load_config()
         if name not in DBManager._INSTANCES:
             raise RuntimeError(
                 f"name:{name} need register first({DBManager._INSTANCES})"
@@ -101,31 +264,360 @@ class DBManager(object):
             session.close()
 
 
+class RoutingSession(Session):
+    """读写分离session
+
+    查询(非FOR UPDATE的select)路由到从库，flush、insert/update/delete、DDL及未指定语句的连接固定主库
+    read_your_writes()范围内的查询同样走主库，用于读取本事务刚写入的数据；
+    session存在待写入对象或当前事务已有写入(flush、DML)后，事务内的查询均走主库
+    """
+
+    def __init__(self, db_manager: DBManager = None, **kwargs):
+        super().__init__(**kwargs)
+        self.db_manager = db_manager
+        self._primary_reads = 0
+        self._write_transaction = None  # 已写入的事务
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self._write_transaction = self.get_transaction()
+        if self._is_replica_read(clause):
+            return self.db_manager.get_read_engine()
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+    def _is_replica_read(self, clause):
+        if self.db_manager is None or not self.db_manager.replicas:
+            return False
+        if self._flushing or self._primary_reads or self.new or self.deleted:
+            return False
+        if self._write_transaction is not None and self._write_transaction is self.get_transaction():
+            return False
+        return isinstance(clause, Select) and clause._for_update_arg is None  # pylint: disable=protected-access
+
+    def read_bind(self):
+        """当前查询应使用的engine"""
+        if self._is_replica_read(sqlalchemy.select(sqlalchemy.literal(1))):
+            return self.db_manager.get_read_engine()
+        return self.bind
+
+    @contextmanager
+    def read_your_writes(self):
+        """范围内查询强制走主库"""
+        self._primary_reads += 1
+        try:
+            yield self
+        finally:
+            self._primary_reads -= 1
+
+
+class AsyncDBManager(object):
+    """基于AsyncEngine的异步db管理，与DBManager共用mysql_*、pg_*配置
+
+    配置中指定async_engine(如mysql+aiomysql、postgresql+asyncpg)时注册
+    """
+    _INSTANCES = {}
+
+    def __init__(self, name, db_cfg: Union[DBCfg, PgDBCfg, str]):
+        if isinstance(db_cfg, str):
+            # 直接传入连接串，如sqlite+aiosqlite:///:memory:
+            create_eng_str, engine_paras = db_cfg, {}
+        else:
+            create_eng_str = DBManager.engine_url(name, db_cfg)
+            engine_paras = {
+                "pool_recycle": 3600,
+                "echo": False,
+            }
+            engine_paras.update(db_pool.default_pool_paras())
+            engine_paras.update(db_cfg.engine_para)
+            # 异步engine暂不做读写分离及连接池自适应
+            for key in ("replica_hosts", "replica_policy", "pool_adaptive"):
+                engine_paras.pop(key, None)
+            for key in ("pool_size", "max_overflow", "pool_recycle"):
+                engine_paras[key] = int(engine_paras[key])
+        self._engine_args = (create_eng_str, engine_paras)
+        self._engine = None
+        self._session = None
+        self._setup_lock = threading.Lock()
+        self.name = name
+
+    def _setup(self):
+        if self._session is None:
+            with self._setup_lock:
+                if self._session is None:
+                    create_eng_str, engine_paras = self._engine_args
+                    self._engine = create_async_engine(create_eng_str, **engine_paras)
+                    # 提交后不过期实例属性，避免session关闭后访问属性触发隐式io
+                    self._session = sessionmaker(bind=self._engine, class_=AsyncSession,
+                                                 expire_on_commit=False)
+        return self
+
+    @property
+    def engine(self):
+        return self._setup()._engine
+
+    @property
+    def session(self):
+        return self._setup()._session
+
+    @staticmethod
+    def get_instance(name):
+        if name not in AsyncDBManager._INSTANCES:
+            config.load_config()
+        if name not in AsyncDBManager._INSTANCES:
+            raise RuntimeError(
+                f"name:{name} need register first({AsyncDBManager._INSTANCES})"
+            )
+        return AsyncDBManager._INSTANCES.get(name)
+
+    @staticmethod
+    def register(name, db_cfg):
+        assert isinstance(db_cfg, (DBCfg, PgDBCfg, str))
+        if name in AsyncDBManager._INSTANCES:
+            frame_log.info("name:{} had registed before", name)
+        AsyncDBManager._INSTANCES[name] = AsyncDBManager(name, db_cfg)
+
+    def get_session(self):
+        return self.session()
+
+    @asynccontextmanager
+    async def session_open(self):
+        """Provide async session context manager"""
+        session = self.get_session()
+        try:
+            yield session
+            await session.commit()
+        except SQLAlchemyError as e:
+            error = str(e.__cause__)
+            await session.rollback()
+            raise RuntimeError(error) from e
+        finally:
+            await session.close()
+
+
+def _session_binding(func):
+    """解析func中session参数的位置和默认值
+
+    :return: (bind, replace)
+             bind(args, kwargs) -> (session参数值, 位置参数下标)
+             replace(args, kwargs, index, session) -> 替换session后的(args, kwargs)
+    """
+    params = list(inspect.signature(func).parameters.values())
+    names = [param.name for param in params]
+    if "session" not in names:
+        raise TypeError(f"{func.__qualname__} need session parameter")
+    param = params[names.index("session")]
+    position = None
+    if param.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD):
+        position = names.index("session")
+    default = None if param.default is inspect.Parameter.empty else param.default
+
+    def _bind(args, kwargs):
+        if "session" in kwargs:
+            return kwargs["session"], None
+        if position is not None and len(args) > position:
+            return args[position], position
+        return default, None
+
+    def _replace(args, kwargs, index, session):
+        if index is None:
+            kwargs["session"] = session
+        else:
+            args = args[:index] + (session,) + args[index + 1:]
+        return args, kwargs
+
+    return _bind, _replace
+
+
 def session_decorate(func):
+    """session注入装饰器
+
+    被装饰函数需有session参数，支持传入Session对象(直接调用)或DBManager注册名称(打开session，结束后提交/回滚)
+    参数位置、默认值在装饰时一次性解析，调用时不再做签名检查
+    """
+    _bind, _replace = _session_binding(func)
+
+    def _get_db_instance(session):
+        if isinstance(session, str):
+            return DBManager.get_instance(session)
+        raise RuntimeError(f"unsupport session:{session}|{type(session)}")
+
+    @functools.wraps(func)
     def _wrapper(*args, **kwargs):
-        call_args = inspect.getcallargs(func, *args, **kwargs)
-        session = call_args.get("session")
-        if isinstance(session, sqlalchemy.orm.session.Session):
+        session, index = _bind(args, kwargs)
+        if isinstance(session, Session):
             return func(*args, **kwargs)
-        if isinstance(session, str):
-            db_instance = DBManager.get_instance(session)
-        else:
+        with _get_db_instance(session).session_open() as session:
+            args, kwargs = _replace(args, kwargs, index, session)
+            return func(*args, **kwargs)
+
+    @functools.wraps(func)
+    def _gen_wrapper(*args, **kwargs):
+        # 生成器函数需在迭代期间保持session打开，迭代结束(或提前关闭)后再提交/释放
+        session, index = _bind(args, kwargs)
+        if isinstance(session, Session):
+            yield from func(*args, **kwargs)
+            return
+        with _get_db_instance(session).session_open() as session:
+            args, kwargs = _replace(args, kwargs, index, session)
+            yield from func(*args, **kwargs)
+
+    if inspect.isgeneratorfunction(func):
+        return _gen_wrapper
+    return _wrapper
+
+
+def async_session_decorate(func):
+    """异步session注入装饰器，session支持AsyncSession对象或AsyncDBManager注册名称"""
+    _bind, _replace = _session_binding(func)
+
+    @functools.wraps(func)
+    async def _wrapper(*args, **kwargs):
+        session, index = _bind(args, kwargs)
+        if isinstance(session, AsyncSession):
+            return await func(*args, **kwargs)
+        if not isinstance(session, str):
             raise RuntimeError(f"unsupport session:{session}|{type(session)}")
-        with db_instance.session_open() as session:
-            call_args["session"] = session
-            arg_spec = inspect.signature(func).parameters
-            vargs = []
-            kws = {}
-            for name, param in arg_spec.items():
-                if param.kind != inspect.Parameter.VAR_KEYWORD:
-                    vargs.append(call_args[name])
-                elif param.kind == inspect.Parameter.KEYWORD_ONLY:
-                    kws.setdefault(name, call_args.get(name, param))
-            return func(*vargs, **kws)
+        async with AsyncDBManager.get_instance(session).session_open() as session:
+            args, kwargs = _replace(args, kwargs, index, session)
+            return await func(*args, **kwargs)
 
     return _wrapper
 
 
+_INVALIDATE_TABLES = "invalidate_tables"  # session.info中待失效缓存的表
+
+
+def _invalidate_on_commit(session, *tables):
+    """事务结束后再使表的结果缓存失效，避免提交前被并发查询以旧数据重新写入缓存"""
+    if isinstance(session, Session) and session.in_transaction():
+        session.info.setdefault(_INVALIDATE_TABLES, set()).update(tables)
+    else:
+        db_cache.invalidate_tables(*tables)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_pending(session):
+    # 回滚时同样失效: 事务内可能已将未提交的数据读入缓存
+    tables = session.info.pop(_INVALIDATE_TABLES, None)
+    if tables:
+        db_cache.invalidate_tables(*tables)
+
+
+@contextmanager
+def _primary_reads(session):
+    """写入方法中ORM自身的查询(merge/get/refresh)走主库"""
+    if isinstance(session, RoutingSession):
+        with session.read_your_writes():
+            yield session
+    else:
+        yield session
+
+
+def _merge_records(cls, objects):
+    """实例/dict转换为按列名分组的records {列名元组: {主键元组: record}}
+
+    同主键多次出现时按输入顺序合并为一条(后出现的列值覆盖)，与逐条merge结果一致
+    """
+    columns = {attr.key: attr.columns[0] for attr in sql_inspect(cls).column_attrs}
+    pk_names = [col.name for col in cls.__table__.primary_key]
+    merged = {}
+    for obj in objects:
+        if isinstance(obj, dict):
+            values = obj
+        else:
+            values = {key: value for key, value in sql_inspect(obj).dict.items() if key in columns}
+        unknown = set(values) - set(columns)
+        if unknown:
+            raise ValueError(f"attrs:{unknown} not in {cls.__tablename__}")
+        record = {columns[key].name: value for key, value in values.items()}
+        if any(record.get(name) is None for name in pk_names):
+            raise ValueError(f"batch merge need primary key:{pk_names}|{record}")
+        key = tuple(record[name] for name in pk_names)
+        merged[key] = dict(merged.pop(key, {}), **record)
+    groups = {}
+    for key, record in merged.items():
+        groups.setdefault(tuple(sorted(record)), {})[key] = record
+    return groups
+
+
+def _merge_table(cls, names):
+    """由写入列及带default/onupdate的列构造表结构
+
+    新增行未赋值的列由sqlalchemy按default生成，更新行未赋值的列按onupdate生成
+    """
+    columns = []
+    for col in cls.__table__.columns:
+        # Sequence等非ColumnDefault的default无arg
+        default = getattr(col.default, "arg", None)
+        onupdate = getattr(col.onupdate, "arg", None)
+        if col.name in names or default is not None or onupdate is not None:
+            columns.append(sqlalchemy.Column(col.name, col.type, primary_key=col.primary_key,
+                                             default=default, onupdate=onupdate))
+    return sqlalchemy.Table(cls.__tablename__, sqlalchemy.MetaData(), *columns,
+                            schema=cls.__table__.schema)
+
+
+def _onupdate_values(table, pk_names, update_cols):
+    """原生upsert(ON CONFLICT/ON DUPLICATE KEY)的更新部分不执行onupdate，按批次生成未赋值列的onupdate值"""
+    values = {}
+    for col in table.columns:
+        if col.onupdate is None or col.name in pk_names or col.name in update_cols:
+            continue
+        arg = getattr(col.onupdate, "arg", None)
+        if col.onupdate.is_callable:
+            # 无参函数由sqlalchemy包装为接收context的函数，需context的onupdate无法在upsert中生成
+            if not hasattr(arg, "__wrapped__"):
+                raise ValueError(f"batch merge unsupported context onupdate:{col.name}")
+            arg = arg(None)
+        if arg is not None:
+            values[col.name] = arg
+    return values
+
+
+def _iter_chunks(values, chunksize):
+    """按块切分List[dict]/dict迭代器/DataFrame"""
+    if isinstance(values, pandas.DataFrame):
+        for idx in range(0, len(values), chunksize):
+            yield _df_records(values.iloc[idx:idx + chunksize])
+        return
+    values = iter(values)
+    while True:
+        chunk = list(itertools.islice(values, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _execute_chunk(execute, stmt, idx, chunk):
+    start = time.perf_counter()
+    result = execute(stmt, chunk)
+    return ChunkStat(idx, len(chunk), result.rowcount, time.perf_counter() - start)
+
+
+def _insert_chunk(engine, stmt, idx, chunk):
+    with engine.begin() as conn:
+        return _execute_chunk(conn.execute, stmt, idx, chunk)
+
+
+def _parallel_insert(engine, stmt, chunks, workers):
+    """多连接并发写入，在途块数不超过workers * 2，避免迭代器被提前读完"""
+    stats, pending = [], set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for idx, chunk in enumerate(chunks):
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    stats.extend(future.result() for future in done)
+                pending.add(executor.submit(_insert_chunk, engine, stmt, idx, chunk))
+            stats.extend(future.result() for future in wait(pending).done)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return sorted(stats)
+
+
 def query_record(cls, session, filters=None, load_attrs=None):
     """query filter wrapper"""
     query = session.query(cls)
@@ -136,6 +628,35 @@ def query_record(cls, session, filters=None, load_attrs=None):
     return query.all()
 
 
+def select_columns(cls, session, filters=None, columns=None):
+    """Core查询指定列(默认全部列属性)，不构造ORM对象、不进入identity map
+
+    :return: (列名列表, 行元组列表)
+    """
+    keys = list(columns or [attr.key for attr in sql_inspect(cls).column_attrs])
+    stmt = sqlalchemy.select(*[getattr(cls, key).label(key) for key in keys])
+    if filters:
+        stmt = stmt.filter(*filters)
+    return keys, session.execute(stmt).all()
+
+
+def _datetime_columns(cls, keys):
+    types = {attr.key: attr.columns[0].type for attr in sql_inspect(cls).column_attrs}
+    return [idx for idx, key in enumerate(keys) if isinstance(types.get(key), sqlalchemy.DateTime)]
+
+
+def datetime_to_timestamp(values) -> pd.Series:
+    """批量转换本地时间为秒级时间戳(同as_dict: 按本地时区，不足1秒部分四舍五入)，空值为<NA>"""
+    index = pd.DatetimeIndex(pd.to_datetime(pd.Series(values, dtype=object)))
+    if index.tz is None:
+        index = index.tz_localize(tz.tzlocal(), ambiguous="NaT", nonexistent="NaT")
+    nanos = index.asi8
+    seconds, remain = numpy.divmod(nanos, 10 ** 9)
+    result = pd.array(seconds + (remain > 5 * 10 ** 8), dtype="Int64")
+    result[index.isna()] = pd.NA
+    return pd.Series(result)
+
+
 class DeclarMixin(object):
     """Mixin with declarative base class"""
 
@@ -162,26 +683,102 @@ class DeclarMixin(object):
     def add(self, session=None):
         frame_log.debug("session:{} add record:{}", session, self)
         session.add(self)
+        _invalidate_on_commit(session, self.__tablename__)
 
     @session_decorate
     def put(self, session=None, replace_dict=None):
         frame_log.debug("session:{} put record:{}", session, self)
         replace_dict = replace_dict or {}
-        for key in replace_dict:
-            if hasattr(self, key):
-                if getattr(self, key) != replace_dict[key]:
-                    setattr(self, key, replace_dict[key])
+        with _primary_reads(session):
+            for key in replace_dict:
+                if hasattr(self, key):
+                    if getattr(self, key) != replace_dict[key]:
+                        setattr(self, key, replace_dict[key])
+        _invalidate_on_commit(session, self.__tablename__)
 
     @session_decorate
     def merge(self, session=None):
         frame_log.debug("session:{} merge record:{}", session, self)
-        session.merge(self)
+        with _primary_reads(session):
+            session.merge(self)
+        _invalidate_on_commit(session, self.__tablename__)
+
+    @classmethod
+    @session_decorate
+    def batch_insert(cls, values, prefixes=None, session=None, chunksize=INSERT_CHUNKSIZE,
+                     workers=1, partial_commit=False) -> BatchInsertResult:
+        """分块批量插入(executemany)，默认在session当前事务中执行
+
+        :param values: dict、List[dict]、dict迭代器或DataFrame，按块消费，无需一次性构造完整列表
+        :param prefixes: insert前缀，如["IGNORE"]
+        :param chunksize: 每块行数，避免单条语句超出max_allowed_packet或绑定参数上限
+        :param workers: 并发写入的连接数，>1时需指定partial_commit=True
+        :param partial_commit: 各块从连接池取独立连接并各自提交，不参与session当前事务，
+                               失败时已提交的块不回滚
+        :return: BatchInsertResult(rows, rowcount, chunks)
+        """
+        if chunksize <= 0 or workers <= 0:
+            raise ValueError(f"illegal chunksize:{chunksize}|workers:{workers}")
+        if workers > 1 and not partial_commit:
+            raise ValueError("workers > 1 commit each chunk separately, need partial_commit=True")
+        if isinstance(values, dict):
+            values = [values]
+        insert_stmt = insert(cls.__table__).prefix_with(*(prefixes or ()))
+        start = time.perf_counter()
+        if not partial_commit:
+            chunks = [_execute_chunk(session.execute, insert_stmt, idx, chunk)
+                      for idx, chunk in enumerate(_iter_chunks(values, chunksize))]
+        else:
+            chunks = _parallel_insert(session.get_bind(clause=insert_stmt), insert_stmt,
+                                      _iter_chunks(values, chunksize), workers)
+            # 各块已在独立连接中提交
+            db_cache.invalidate_tables(cls.__tablename__)
+        _invalidate_on_commit(session, cls.__tablename__)
+        result = BatchInsertResult(sum(chunk.rows for chunk in chunks),
+                                   sum(chunk.rowcount for chunk in chunks), chunks)
+        frame_log.info("batch insert tb_name:{}|rows:{}|rowcount:{}|chunks:{}|workers:{}|cost:{:.3f}s",
+                       cls.__tablename__, result.rows, result.rowcount, len(chunks), workers,
+                       time.perf_counter() - start)
+        return result
 
     @classmethod
     @session_decorate
-    def batch_insert(cls, values, prefixes=None, session=None):
-        insert_stmt = insert(cls.__table__, values=values, prefixes=prefixes)
-        return session.execute(insert_stmt)
+    def batch_merge(cls, objects, chunksize=UPSERT_CHUNKSIZE, session=None) -> WriteResult:
+        """批量merge: 按主键存在则更新、不存在则插入
+
+        与merge逐条先查询再写入不同，按批次使用数据库原生upsert(pg: ON CONFLICT, mysql: ON DUPLICATE KEY)，
+        其他数据库一次IN查询已存在主键后分别批量插入、更新；在session当前事务中执行
+        :param objects: 模型实例或dict(key为属性名)，仅写入已赋值的属性，新增行未赋值的列使用模型default
+        :param chunksize: 每批行数
+        :return: WriteResult(inserted, updated)
+        """
+        if chunksize <= 0:
+            raise ValueError(f"illegal chunksize:{chunksize}")
+        with _primary_reads(session):
+            groups = _merge_records(cls, objects)
+            # 先写入session中未flush的变更，保证执行顺序
+            session.flush()
+            conn = session.connection()
+            pk_names = [col.name for col in cls.__table__.primary_key]
+            inserted = updated = 0
+            for names, records in groups.items():
+                table = _merge_table(cls, names)
+                update_cols = [name for name in names if name not in pk_names]
+                records = list(records.values())
+                for idx in range(0, len(records), chunksize):
+                    num_ins, num_upd = _upsert_batch(conn, table, pk_names, records[idx:idx + chunksize],
+                                                     update_cols)
+                    inserted += num_ins
+                    updated += num_upd
+        # 使identity map中已加载的同主键实例过期，后续访问重新加载
+        keys = {key for records in groups.values() for key in records}
+        for identity, instance in list(session.identity_map.items()):
+            if identity[0] is cls and identity[1] in keys:
+                session.expire(instance)
+        _invalidate_on_commit(session, cls.__tablename__)
+        frame_log.info("batch merge tb_name:{}|inserted:{}|updated:{}",
+                       cls.__tablename__, inserted, updated)
+        return WriteResult(inserted, updated)
 
     @classmethod
     @session_decorate
@@ -205,6 +802,78 @@ class DeclarMixin(object):
             result = None
         return result
 
+    @classmethod
+    @session_decorate
+    def query_iter(cls, filters=None, load_attrs=None, batch_size=1000, session="default"):
+        """分批(yield_per)迭代查询结果，逐个expunge，内存占用只与batch_size相关"""
+        query = session.query(cls)
+        if filters:
+            query = query.filter(*filters)
+        if load_attrs:
+            query = query.options(load_only(*load_attrs))
+        for result in query.yield_per(batch_size):
+            session.expunge(result)
+            yield result
+
+    @classmethod
+    @session_decorate
+    def query_dicts(cls, filters=None, columns=None, jsonable=False,
+                    session="default") -> typing.List[dict]:
+        """按列查询为dict列表，跳过ORM对象构造，结果同as_dict
+
+        :param columns: 查询的列属性名，默认全部
+        :param jsonable: datetime列是否批量转换为时间戳
+        """
+        keys, rows = select_columns(cls, session, filters, columns)
+        if jsonable and rows:
+            dt_cols = _datetime_columns(cls, keys)
+            if dt_cols:
+                values = list(zip(*rows))
+                for idx in dt_cols:
+                    values[idx] = [None if value is pd.NA else int(value)
+                                   for value in datetime_to_timestamp(values[idx])]
+                rows = zip(*values)
+        return [dict(zip(keys, row)) for row in rows]
+
+    @classmethod
+    @session_decorate
+    def query_df(cls, filters=None, columns=None, jsonable=False,
+                 session="default") -> pd.DataFrame:
+        """按列查询为DataFrame，参数同query_dicts，jsonable时datetime列转换为Int64时间戳"""
+        keys, rows = select_columns(cls, session, filters, columns)
+        data = pd.DataFrame.from_records(rows, columns=keys, coerce_float=True)
+        if jsonable:
+            for idx in _datetime_columns(cls, keys):
+                data.isetitem(idx, datetime_to_timestamp(data.iloc[:, idx]).set_axis(data.index))
+        return data
+
+    @classmethod
+    @async_session_decorate
+    async def async_query(cls, filters, expunge=True, load_attrs=None, session="default"):
+        """query的异步版本, session为AsyncDBManager注册名称或AsyncSession"""
+        stmt = sqlalchemy.select(cls)
+        if filters:
+            stmt = stmt.filter(*filters)
+        if load_attrs:
+            stmt = stmt.options(load_only(*load_attrs))
+        results = (await session.execute(stmt)).scalars().all()
+        if expunge:
+            for result in results:
+                session.expunge(result)
+        return results
+
+    @classmethod
+    @async_session_decorate
+    async def async_query_one(cls, filters, expunge=True, load_attrs=None, session="default"):
+        result = await cls.async_query(filters, expunge, load_attrs, session=session)
+        if result:
+            if len(result) != 1:
+                raise RuntimeError(f"multiple object found:{len(result)}")
+            result = result[0]
+        else:
+            result = None
+        return result
+
     @classmethod
     @session_decorate
     def create_table(cls, check_first=True, session=None):
@@ -219,51 +888,541 @@ def pd_to_sql(df: pandas.DataFrame, tb_name: str = None,
               tb: Union[Base, DeclarMixin] = None,
               session: Union[str, Session] = "default",
               upper_or_lower: Union['str'] = "upper",
-              **kwargs):
-    """dataframe插入数据库"""
-    name = tb.__tablename__ if tb else tb_name
-    if upper_or_lower == "upper":
-        df.columns = map(str.upper, df.columns)
-        name = name.upper()
+              bulk_load: bool = False,
+              chunksize: int = None,
+              if_exists: str = "replace",
+              **kwargs) -> "WriteResult":
+    """dataframe插入数据库
+
+    :param bulk_load: 是否使用数据库原生批量导入(pg: COPY FROM STDIN, mysql: LOAD DATA LOCAL INFILE)
+                      其他数据库(如sqlite)降级为分块executemany
+    :param chunksize: 每批写入行数，默认bulk_load为BULK_CHUNKSIZE、upsert为UPSERT_CHUNKSIZE
+    :param if_exists: replace: 删表重建后写入
+                      append: 追加写入
+                      upsert: 按tb模型主键增量写入，已存在的行更新、不存在的行插入，需指定tb
+    :param upper_or_lower: 表名及列名大小写，append/upsert指定tb时写入模型对应的表，表名及列名以模型为准
+    :param kwargs: pandas.to_sql扩展参数，bulk_load时仅用于建表
+    :return: WriteResult(inserted, updated)
+    """
+    if if_exists not in ("replace", "append", "upsert"):
+        raise ValueError(f"unsupport if_exists:{if_exists}")
+    if if_exists == "upsert" and tb is None:
+        raise ValueError("upsert mode need tb with primary key")
+    if tb is not None and if_exists != "replace":
+        df.columns = _model_columns(df, tb)
+        name = tb.__table__.name
+        if tb.__table__.schema:
+            kwargs.setdefault("schema", tb.__table__.schema)
+    else:
+        name = tb.__tablename__ if tb else tb_name
+        if upper_or_lower == "upper":
+            df.columns = map(str.upper, df.columns)
+            name = name.upper()
+        else:
+            df.columns = map(str.lower, df.columns)
+            name = name.lower()
+    frame_log.info("insert to sql for tb_name:{}|mode:{}", name, if_exists)
+    if if_exists == "upsert":
+        result = _upsert(df, tb, session, chunksize or UPSERT_CHUNKSIZE)
+    elif bulk_load:
+        # 仅通过pandas创建(重建)空表结构，数据走批量导入；建表与导入使用session同一连接(同一事务)
+        df.head(0).to_sql(name, session.connection(), if_exists=if_exists, index=False, **kwargs)
+        _bulk_load(df, name, session, chunksize or BULK_CHUNKSIZE, kwargs.get("schema"))
+        result = WriteResult(len(df), 0)
+    else:
+        df.to_sql(name, session.bind, if_exists=if_exists, index=False,
+                  method="multi", chunksize=chunksize, **kwargs)
+        result = WriteResult(len(df), 0)
+    _invalidate_on_commit(session, name)
+    frame_log.info("inserting succeed, num:{}|inserted:{}|updated:{}",
+                   len(df), result.inserted, result.updated)
+    return result
+
+
+def _df_records(df: pandas.DataFrame) -> typing.List[dict]:
+    """DataFrame转换为records, NaN转换为None"""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _model_columns(df, tb):
+    """DataFrame列名(不区分大小写)对应的模型列名"""
+    model_cols = {col.name.lower(): col.name for col in tb.__table__.columns}
+    unknown = [col for col in df.columns if str(col).lower() not in model_cols]
+    if unknown:
+        raise ValueError(f"columns:{unknown} not in {tb.__tablename__}")
+    return [model_cols[str(col).lower()] for col in df.columns]
+
+
+def _upsert(df, tb, session, chunksize):
+    """按模型主键分批upsert，df列名已对应模型列名"""
+    if chunksize <= 0:
+        raise ValueError(f"illegal chunksize:{chunksize}")
+    model_table = tb.__table__
+    columns = [
+        sqlalchemy.Column(col, model_table.c[col].type, primary_key=model_table.c[col].primary_key)
+        for col in df.columns
+    ]
+    table = sqlalchemy.Table(model_table.name, sqlalchemy.MetaData(), *columns, schema=model_table.schema)
+    pk_names = [col.name for col in table.primary_key]
+    if len(pk_names) != len(model_table.primary_key):
+        raise ValueError(f"upsert need primary key columns:{list(model_table.primary_key)}")
+    # 同批次主键重复时保留最后一条
+    df = df.drop_duplicates(subset=pk_names, keep="last")
+    conn = session.connection()
+    inserted = updated = 0
+    for idx in range(0, len(df), chunksize):
+        records = _df_records(df.iloc[idx:idx + chunksize])
+        num_ins, num_upd = _upsert_batch(conn, table, pk_names, records)
+        inserted += num_ins
+        updated += num_upd
+    return WriteResult(inserted, updated)
+
+
+def _existing_keys(conn, table, pk_names, records):
+    """返回(各记录主键, 数据库中已存在的主键集合)"""
+    pk_cols = [table.c[col] for col in pk_names]
+    keys = [tuple(record[col] for col in pk_names) for record in records]
+    if len(pk_cols) == 1:
+        cond = pk_cols[0].in_([key[0] for key in keys])
     else:
-        df.columns = map(str.lower, df.columns)
-        name = name.lower()
-    frame_log.info("insert to sql for tb_name:{}", name)
-    df.to_sql(name, session.bind, if_exists="replace",
-              index=False, method="multi", **kwargs)
-    frame_log.info("inserting succeed, num:{}", len(df))
+        cond = sqlalchemy.tuple_(*pk_cols).in_(keys)
+    return keys, set(tuple(row) for row in conn.execute(sqlalchemy.select(*pk_cols).where(cond)))
+
+
+def _upsert_batch(conn, table, pk_names, records, update_cols=None):
+    """单批upsert, 返回(新增行数, 更新行数)
+
+    :param update_cols: 已存在行需更新的列，默认table中全部非主键列
+    """
+    if update_cols is None:
+        update_cols = [col.name for col in table.columns if col.name not in pk_names]
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        stmt = pg_insert(table).values(records)
+        if update_cols:
+            set_ = {col: stmt.excluded[col] for col in update_cols}
+            set_.update(_onupdate_values(table, pk_names, update_cols))
+            stmt = stmt.on_conflict_do_update(index_elements=pk_names, set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=pk_names)
+        # xmax = 0 表示本次插入的新行
+        flags = conn.execute(stmt.returning(sqlalchemy.literal_column("xmax = 0"))).scalars().all()
+        inserted = sum(1 for flag in flags if flag)
+        return inserted, len(flags) - inserted
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(records)
+        if not update_cols:
+            return conn.execute(stmt.prefix_with("IGNORE")).rowcount, 0
+        set_ = {col: stmt.inserted[col] for col in update_cols}
+        set_.update(_onupdate_values(table, pk_names, update_cols))
+        stmt = stmt.on_duplicate_key_update(set_)
+        # ON DUPLICATE KEY UPDATE的rowcount依赖CLIENT_FOUND_ROWS且未变化的行计0/1，
+        # 新增、更新行数按执行前已存在的主键统计
+        keys, exists = _existing_keys(conn, table, pk_names, records)
+        conn.execute(stmt)
+        updated = sum(1 for key in keys if key in exists)
+        return len(records) - updated, updated
+    # 其他数据库: 先查询已存在主键，再分别executemany插入和更新
+    pk_cols = [table.c[col] for col in pk_names]
+    keys, exists = _existing_keys(conn, table, pk_names, records)
+    new_records = [record for key, record in zip(keys, records) if key not in exists]
+    old_records = [record for key, record in zip(keys, records) if key in exists]
+    if new_records:
+        conn.execute(table.insert(), new_records)
+    if old_records and update_cols:
+        stmt = table.update().where(
+            *[col == sqlalchemy.bindparam(f"_pk_{col.name}") for col in pk_cols]
+        ).values({col: sqlalchemy.bindparam(col) for col in update_cols})
+        conn.execute(stmt, [
+            dict(record, **{f"_pk_{col}": record[col] for col in pk_names})
+            for record in old_records
+        ])
+    return len(new_records), len(old_records) if update_cols else 0
+
+
+def _bulk_load(df: pandas.DataFrame, name: str, session: Session, chunksize: int, schema: str = None):
+    """根据session绑定的数据库驱动选择批量导入方式"""
+    if chunksize is None or chunksize <= 0:
+        raise ValueError(f"illegal chunksize:{chunksize}")
+    driver = session.bind.dialect.driver
+    if driver == "psycopg2":
+        loader = _copy_from_stdin
+    elif driver == "pymysql":
+        loader = _load_data_infile
+    else:
+        loader = _insert_executemany
+    frame_log.info("bulk load tb_name:{} by {}", name, loader.__name__)
+    conn = session.connection()
+    for idx in range(0, len(df), chunksize):
+        loader(conn, name, df.iloc[idx:idx + chunksize], schema)
+
+
+def _quote_columns(conn, name, df, schema=None):
+    preparer = conn.dialect.identifier_preparer
+    columns = ",".join(preparer.quote(str(col)) for col in df.columns)
+    table = preparer.quote(name)
+    if schema:
+        table = f"{preparer.quote_schema(schema)}.{table}"
+    return table, columns
+
+
+# COPY/LOAD DATA文本格式的NULL标记，数据中的反斜杠均转义，不会与数据混淆
+_TEXT_NULL = "\\N"
+_TEXT_ESCAPES = (("\\", "\\\\"), ("\t", "\\t"), ("\n", "\\n"), ("\r", "\\r"))
+
+
+def _text_rows(df):
+    """DataFrame转换为制表符分隔的文本格式(pg COPY text / mysql LOAD DATA默认格式)
+
+    空值写为\\N，空字符串保留为空字段
+    """
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        text = series.astype(str)
+        if not pandas.api.types.is_numeric_dtype(series.dtype):
+            for char, escaped in _TEXT_ESCAPES:
+                text = text.str.replace(char, escaped, regex=False)
+        columns.append(text.mask(series.isna(), _TEXT_NULL).tolist())
+    return "".join("\t".join(row) + "\n" for row in zip(*columns))
+
+
+def _copy_from_stdin(conn, name, df, schema=None):
+    """PostgreSQL COPY ... FROM STDIN(text格式)"""
+    table, columns = _quote_columns(conn, name, df, schema)
+    buffer = io.StringIO(_text_rows(df))
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT text, NULL '\\N')", buffer)
+
+
+def _load_data_infile(conn, name, df, schema=None):
+    """MySQL LOAD DATA LOCAL INFILE, 需在连接参数中开启local_infile
+
+    >>> [mysql_xxx]
+    >>> connect_args = {"local_infile": true}
+    """
+    table, columns = _quote_columns(conn, name, df, schema)
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", encoding="utf-8",
+                                     newline="", delete=False) as file:
+        file.write(_text_rows(df))
+    try:
+        with conn.connection.cursor() as cursor:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8 "
+                "FIELDS TERMINATED BY '\\t' ENCLOSED BY '' ESCAPED BY '\\\\' "
+                f"LINES TERMINATED BY '\\n' ({columns})", (file.name,))
+    finally:
+        os.remove(file.name)
+
+
+def _insert_executemany(conn, name, df, schema=None):
+    """通用降级方式: executemany"""
+    table = sqlalchemy.table(name, *[sqlalchemy.column(str(col)) for col in df.columns], schema=schema)
+    conn.execute(table.insert(), _df_records(df))
 
 
 @session_decorate
 def pd_read_sql(sql: str | Query, session: Union[str, Session] = "default",
-                decoder: typing.Callable = None, **kwargs) -> pd.DataFrame:
+                decoder: typing.Callable = None, cache: bool = False,
+                cache_ttl: int = None, disk_cache: bool = False, columnar: bool = False,
+                dtypes: dict = None, **kwargs) -> pd.DataFrame:
     """基于pandas的sql查询
     支持事务回滚和orm查询操作
 
     :param sql: 支持str原生sql语句和sqlalchemy.Query对象实体（需兼容Orm语法，参考：https://docs.sqlalchemy.org/）
     :param session:连接对象，默认session='default',根据conf配置选项调整
     :param decoder:输出格式化函数，对查询结果进一步处理
+    :param cache:是否使用进程内结果缓存(适用于低频变更的参考数据)，写入相关表时自动失效
+    :param cache_ttl:缓存过期时间(秒)，默认见db_cache.configure_result_cache、configure_disk_cache
+    :param disk_cache:是否使用磁盘结果缓存(跨进程持久化，需pyarrow)，适用于重复读取的大量历史数据，
+                      目录、容量等见db_cache.configure_disk_cache，写入相关表时自动失效
+    :param columnar:是否按列直接从DBAPI游标构造DataFrame(不经过sqlalchemy类型处理)，适用于宽数值表，
+                    仅支持params、index_col、parse_dates扩展参数
+    :param dtypes:columnar时的列类型{列名: dtype}，整型、布尔列存在NULL时转换为Int64/boolean
     :param kwargs:pandas.read_sql扩展参数
                  >>> pandas.read_sql()
     :return:
     """
-    # 支持sqlalchemy.Query对象语句
-    if isinstance(sql, Query):
-        sql = sql.statement
-        dialect = session.bind.dialect
-        sql = sql.compile(
-            dialect=dialect, compile_kwargs={
-                "literal_binds": True})  # 支持对于搜索条件值的格式化处理
-        # 解决关于psycopg2驱动对于大写列、表名""查找失败的问题
-        if dialect.driver == "psycopg2":
-            sql = str(sql).replace('"', '')
-    frame_log.info("Reading sql to df: '{}'", sql)
-    data = pandas.read_sql(sql=sql, con=session.bind, **kwargs)
+    sql = _compile_sql(sql, session.bind.dialect)
+    if columnar:
+        unsupported = set(kwargs) - {"params", "index_col", "parse_dates"}
+        if unsupported:
+            raise ValueError(f"unsupport columnar kwargs:{unsupported}")
+    key = data = None
+    if cache or disk_cache:
+        key_kwargs = dict(kwargs, columnar=columnar, dtypes=dtypes) if columnar else kwargs
+        key = db_cache.result_cache_key(session.bind, sql, key_kwargs)
+    if cache:
+        data = db_cache.RESULT_CACHE.get(key)
+    if data is None and disk_cache:
+        data = db_cache.disk_cache().get(key)
+        if data is not None and cache:
+            db_cache.RESULT_CACHE.set(key, data, db_cache.sql_tables(key[1]), cache_ttl)
+    if data is None:
+        frame_log.info("Reading sql to df: '{}'", _sql_text(sql))
+        if columnar:
+            data = _read_sql_columnar(sql, _read_bind(session), dtypes, **kwargs)
+        else:
+            data = pandas.read_sql(sql=sql, con=_read_bind(session), **kwargs)
+        if disk_cache:
+            db_cache.disk_cache().set(key, data, db_cache.sql_tables(key[1]), cache_ttl)
+        if cache:
+            db_cache.RESULT_CACHE.set(key, data, db_cache.sql_tables(key[1]), cache_ttl)
+    else:
+        frame_log.info("Reading sql from cache: '{}'", _sql_text(sql))
+    if decoder:
+        data = decoder(data)
+    return data
+
+
+def _read_sql_columnar(sql, bind, dtypes=None, params=None, index_col=None, parse_dates=None):
+    with bind.connect() as conn:
+        if isinstance(sql, str):
+            result = conn.exec_driver_sql(sql, params or ())
+        else:
+            result = conn.execute(sql, params or {})
+        try:
+            data = db_fetch.fetch_columnar(result.cursor, list(result.keys()), dtypes)
+        finally:
+            result.close()
+    for column in ([parse_dates] if isinstance(parse_dates, str) else parse_dates or ()):
+        data[column] = pd.to_datetime(data[column])
+    if index_col is not None:
+        data = data.set_index(index_col)
+    return data
+
+
+@session_decorate
+def pd_read_sql_stream(sql: str | Query, session: Union[str, Session] = "default",
+                       decoder: typing.Callable = None, chunksize: int = 10000,
+                       **kwargs) -> typing.Iterator[pd.DataFrame]:
+    """基于服务端游标的分块sql查询
+    结果集按chunksize分块迭代返回，内存峰值只与单块大小相关，适用于百万级以上的大结果集
+
+    :param sql: 同pd_read_sql
+    :param session:连接对象，默认session='default'，迭代期间保持连接，迭代结束后释放
+    :param decoder:输出格式化函数，对每一块查询结果分别处理
+    :param chunksize:每块行数
+    :param kwargs:pandas.read_sql扩展参数
+    :return: DataFrame迭代器
+    """
+    if chunksize is None or chunksize <= 0:
+        raise ValueError(f"illegal chunksize:{chunksize}")
+    sql = _compile_sql(sql, session.bind.dialect)
+    frame_log.info("Streaming sql to df(chunksize:{}): '{}'", chunksize, _sql_text(sql))
+    # stream_results: psycopg2使用命名游标、pymysql使用SSCursor，逐块从服务端拉取
+    conn = session.connection(bind_arguments={"bind": _read_bind(session)})
+    conn = conn.execution_options(stream_results=True)
+    num = 0
+    for chunk in pandas.read_sql(sql=sql, con=conn, chunksize=chunksize, **kwargs):
+        num += len(chunk)
+        if decoder:
+            chunk = decoder(chunk)
+        yield chunk
+    frame_log.info("streaming succeed, num:{}", num)
+
+
+@session_decorate
+def pd_read_sql_partitioned(sql: str | Select, start_time, end_time, step: int = 24 * 60 * 60,
+                            session: Union[str, Session] = "default",
+                            decoder: typing.Callable = None, max_workers: int = 4,
+                            retries: int = 0, is_reversed: bool = False,
+                            **kwargs) -> pd.DataFrame:
+    """按时间分片并发查询，结果按分片顺序合并
+
+    分片由time_utils.get_time_group生成，各分片从连接池取独立连接并发执行(配置从库时分散到各从库)
+    :param sql: 含:start_time、:end_time绑定参数的sql模板，相邻分片边界相同，需使用左闭右开区间
+                >>> "select * from tb_tick where ts >= :start_time and ts < :end_time"
+    :param start_time: 起始时间 %Y-%m-%d %H:%M:%S
+    :param end_time: 结束时间 %Y-%m-%d %H:%M:%S
+    :param step: 分片时长(秒)
+    :param decoder: 输出格式化函数，对合并后的结果处理
+    :param max_workers: 最大并发查询数
+    :param retries: 单个分片失败重试次数
+    :param is_reversed: 分片从结束时间到起始时间倒序
+    :param kwargs: pandas.read_sql扩展参数，params与分片时间合并
+    """
+    chunks = list(_read_partitions(sql, start_time, end_time, step, session, max_workers,
+                                   retries, is_reversed, kwargs))
+    if not chunks:
+        return pandas.DataFrame()
+    data = pandas.concat(chunks, ignore_index="index_col" not in kwargs)
+    if decoder:
+        data = decoder(data)
+    return data
+
+
+@session_decorate
+def pd_read_sql_partitioned_stream(sql: str | Select, start_time, end_time,
+                                   step: int = 24 * 60 * 60,
+                                   session: Union[str, Session] = "default",
+                                   decoder: typing.Callable = None, max_workers: int = 4,
+                                   retries: int = 0, is_reversed: bool = False,
+                                   **kwargs) -> typing.Iterator[pd.DataFrame]:
+    """pd_read_sql_partitioned的迭代版本，按分片顺序逐个返回，decoder对每个分片分别处理
+
+    预取的分片数不超过max_workers * 2，提前结束迭代时取消未开始的分片
+    """
+    for chunk in _read_partitions(sql, start_time, end_time, step, session, max_workers,
+                                  retries, is_reversed, kwargs):
+        if decoder:
+            chunk = decoder(chunk)
+        yield chunk
+
+
+def _read_partitions(sql, start_time, end_time, step, session, max_workers, retries,
+                     is_reversed, kwargs):
+    from qt_quant.common.utilities.time_utils import get_time_group  # 依赖qtlib，按需导入
+
+    if max_workers <= 0 or retries < 0:
+        raise ValueError(f"illegal max_workers:{max_workers}|retries:{retries}")
+    sql = sqlalchemy.text(sql) if isinstance(sql, str) else _compile_sql(sql, session.bind.dialect)
+    kwargs = dict(kwargs)
+    params = kwargs.pop("params", None) or {}
+    slices = get_time_group(start_time, end_time, step, is_reversed)
+    frame_log.info("Reading sql partitioned({}~{}|step:{}|workers:{}): '{}'",
+                   start_time, end_time, step, max_workers, _sql_text(sql))
+    start, num = time.perf_counter(), 0
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for bounds in slices:
+                pending.append(executor.submit(_read_partition, sql, session, bounds,
+                                               dict(params, start_time=bounds[0], end_time=bounds[1]),
+                                               retries, kwargs))
+                if len(pending) >= max_workers * 2:
+                    chunk = pending.popleft().result()
+                    num += len(chunk)
+                    yield chunk
+            while pending:
+                chunk = pending.popleft().result()
+                num += len(chunk)
+                yield chunk
+        finally:
+            for future in pending:
+                future.cancel()
+    frame_log.info("partitioned reading succeed, num:{}|cost:{:.3f}s", num, time.perf_counter() - start)
+
+
+def _read_partition(sql, session, bounds, params, retries, kwargs):
+    for attempt in range(retries + 1):
+        try:
+            return pandas.read_sql(sql=sql, con=_read_bind(session), params=params, **kwargs)
+        except SQLAlchemyError as e:
+            if attempt >= retries:
+                raise
+            frame_log.warning("partition {} read failed, retry:{}|error:{}", bounds, attempt + 1, e)
+            time.sleep(min(0.1 * 2 ** attempt, 5))
+    return None
+
+
+@async_session_decorate
+async def async_pd_read_sql(sql: str | Query, session: Union[str, AsyncSession] = "default",
+                            decoder: typing.Callable = None, **kwargs) -> pd.DataFrame:
+    """pd_read_sql的异步版本，查询在AsyncEngine连接上执行，不阻塞事件循环
+
+    :param sql: 同pd_read_sql
+    :param session: AsyncDBManager注册名称或AsyncSession对象，默认session='default'
+    :param decoder: 同pd_read_sql
+    :param kwargs: pandas.read_sql扩展参数
+    :return:
+    """
+
+    def _read_sql(sync_session):
+        sql_ = _compile_sql(sql)
+        frame_log.info("Reading sql to df: '{}'", _sql_text(sql_))
+        # AsyncSession底层为2.0风格连接，原生sql需包装为text
+        if isinstance(sql_, str):
+            sql_ = sqlalchemy.text(sql_)
+        return pandas.read_sql(sql=sql_, con=sync_session.connection(), **kwargs)
+
+    data = await session.run_sync(_read_sql)
     if decoder:
         data = decoder(data)
     return data
 
 
+def _read_bind(session):
+    """查询使用的engine, 读写分离session优先路由到从库"""
+    if isinstance(session, RoutingSession):
+        return session.read_bind()
+    return session.bind
+
+
+class _CaseFoldPreparerMixin(object):
+    """仅因含大写字母才需要加引号的标识符不加引号，由数据库按规则折叠为小写"""
+
+    def _requires_quotes(self, value):
+        return super()._requires_quotes(value.lower())
+
+
+_CASE_FOLD_PREPARERS = weakref.WeakKeyDictionary()  # dialect -> preparer
+
+
+def _case_fold_preparer(dialect):
+    preparer = _CASE_FOLD_PREPARERS.get(dialect)
+    if preparer is None:
+        preparer_cls = type(dialect.identifier_preparer)
+        preparer_cls = type(f"CaseFold{preparer_cls.__name__}", (_CaseFoldPreparerMixin, preparer_cls), {})
+        preparer = _CASE_FOLD_PREPARERS[dialect] = preparer_cls(dialect)
+    return preparer
+
+
+class _CaseFolded(Executable, ClauseElement):
+    """statement包装: 编译时大写标识符不加引号，按原engine、dialect执行并参与编译缓存"""
+    __visit_name__ = "case_folded"
+    _traverse_internals = [("element", InternalTraversal.dp_clauseelement)]
+    inherit_cache = True
+
+    def __init__(self, element):
+        self.element = element
+        self._execution_options = element._execution_options  # pylint: disable=protected-access
+
+    @property
+    def _all_selected_columns(self):
+        return self.element._all_selected_columns  # pylint: disable=protected-access
+
+
+@compiles(_CaseFolded)
+def _compile_case_folded(element, compiler, **kwargs):
+    preparer = compiler.preparer
+    compiler.preparer = _case_fold_preparer(compiler.dialect)
+    try:
+        return compiler.process(element.element, **kwargs)
+    finally:
+        compiler.preparer = preparer
+
+
+_SQL_TEXT_CACHE = sqlalchemy.util.LRUCache(512)
+
+
+def _sql_text(sql):
+    """日志用sql文本, statement按结构缓存渲染结果，避免每次查询重复编译"""
+    if isinstance(sql, str):
+        return sql
+    cache_key = sql._generate_cache_key()  # pylint: disable=protected-access
+    if cache_key is None:
+        return str(sql)
+    text = _SQL_TEXT_CACHE.get(cache_key.key)
+    if text is None:
+        text = _SQL_TEXT_CACHE[cache_key.key] = str(sql)
+    return f"{text}|params:{[bind.effective_value for bind in cache_key.bindparams]}"
+
+
+def _compile_sql(sql, dialect=None):
+    """Query对象转换为sqlalchemy statement
+
+    条件值以绑定参数传递(不再使用literal_binds)，同结构语句可命中sqlalchemy编译缓存及数据库执行计划缓存
+    """
+    # 支持sqlalchemy.Query对象语句
+    if isinstance(sql, Query):
+        sql = sql.statement
+    # 解决关于psycopg2驱动对于大写列、表名""查找失败的问题
+    if dialect is not None and dialect.driver == "psycopg2" and isinstance(sql, Select):
+        sql = _CaseFolded(sql)
+    return sql
+
+
 def db_config_handle(conf):
     """注册DB配置初始化"""
     mysql_fix = "mysql_"
@@ -271,7 +1430,15 @@ def db_config_handle(conf):
 
     for section in conf.iter_keys():
 
-        if section.startswith(mysql_fix):
+        if section == "sql_profiler":
+            # [sql_profiler]
+            # enable = true
+            # slow_threshold = 0.5
+            if conf.get(section, "enable", default="false").lower() in ("1", "true", "yes"):
+                DBManager.enable_profiler(conf.get(section, "slow_threshold",
+                                                   default=db_profiler.DEFAULT_SLOW_THRESHOLD,
+                                                   encode=float))
+        elif section.startswith(mysql_fix):
             # MySQL
             db_name = conf.get(section, "db_name")
             engine = conf.get(section, "engine", default="mysql+pymysql")
@@ -282,8 +1449,15 @@ def db_config_handle(conf):
             charset = conf.get(section, "charset", default="utf8")
             extra = set(conf.iter_keys(section)) - set(DBCfg._fields)
             engine_para = dict([(name, conf.get(section, name)) for name in extra])
+            if "connect_args" in engine_para:
+                engine_para["connect_args"] = json.loads(engine_para["connect_args"])
+            async_engine = engine_para.pop("async_engine", None)
             db_cfg = DBCfg(engine, db_name, user, passwd, host, port, charset, engine_para)
             DBManager.register(section[len(mysql_fix):], db_cfg)
+            if async_engine:
+                AsyncDBManager.register(
+                    section[len(mysql_fix):],
+                    db_cfg._replace(engine=async_engine, engine_para=dict(engine_para)))
         elif section.startswith(pg_fix):
             # PostgreSQL
             engine = conf.get(section, "engine", default="postgresql+psycopg2")
@@ -296,9 +1470,14 @@ def db_config_handle(conf):
             engine_para = dict([(name, conf.get(section, name)) for name in extra])
             if "connect_args" in engine_para:
                 engine_para["connect_args"] = json.loads(engine_para["connect_args"])
+            async_engine = engine_para.pop("async_engine", None)
             db_cfg = PgDBCfg(engine, db_name, user, passwd, host, port, engine_para)
             DBManager.register(section[len(pg_fix):], db_cfg)
+            if async_engine:
+                AsyncDBManager.register(
+                    section[len(pg_fix):],
+                    db_cfg._replace(engine=async_engine, engine_para=dict(engine_para)))
 
 
-config.CommonConfig()
+# 配置已加载时立即注册，否则在配置加载(config.load_config)时注册
 config.ConfigManager.register_config_handler(db_config_handle)
@@ -0,0 +1,175 @@
+# vim set fileencoding=utf-8
+"""db连接池监控模块"""
+import os
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from common import async_helper
+from common.qt_logging import frame_log
+
+DEFAULT_MAX_CONNECTIONS = 100  # 单个数据库分配给本服务的连接数
+ADAPT_INTERVAL = 200  # 自适应模式下每次评估间隔的checkout次数
+ADAPT_WAIT_THRESHOLD = 0.01  # 平均等待超过该值(秒)时扩容
+
+
+def default_pool_paras():
+    """根据worker数、线程数推导默认连接池大小
+
+    WEB_CONCURRENCY: uvicorn/gunicorn worker进程数，默认1
+    DB_MAX_CONNECTIONS: 单个数据库分配给本服务(所有worker)的连接数，默认DEFAULT_MAX_CONNECTIONS
+    单进程连接上限取线程数(async_helper.MAX_WORKERS)与连接预算的较小值，一半常驻、一半溢出
+    """
+    workers = max(int(os.environ.get("WEB_CONCURRENCY", 1)), 1)
+    budget = int(os.environ.get("DB_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)) // workers
+    limit = max(min(async_helper.MAX_WORKERS, budget), 1)
+    pool_size = max(limit // 2, 1)
+    return {"pool_size": pool_size, "max_overflow": limit - pool_size}
+
+
+class PoolStats(object):
+    """连接池统计: checkout次数/等待耗时、超时次数、连接使用时长"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.connects = 0
+        self.age_max = 0.0
+        self.peak_checked_out = 0
+        # 自适应评估窗口
+        self._window_checkouts = 0
+        self._window_wait = 0.0
+        self._window_timeouts = 0
+        self._window_peak = 0
+
+    def on_checkout(self, wait, checked_out):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            self._window_checkouts += 1
+            self._window_wait += wait
+            self._window_peak = max(self._window_peak, checked_out)
+
+    def on_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+            self._window_timeouts += 1
+
+    def on_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def on_age(self, age):
+        with self._lock:
+            self.age_max = max(self.age_max, age)
+
+    @property
+    def window_checkouts(self):
+        return self._window_checkouts
+
+    def pop_window(self):
+        """返回并重置评估窗口(checkouts, 平均等待, 超时次数, 峰值占用)"""
+        with self._lock:
+            window = (self._window_checkouts,
+                      self._window_wait / self._window_checkouts if self._window_checkouts else 0.0,
+                      self._window_timeouts, self._window_peak)
+            self._window_checkouts = self._window_timeouts = self._window_peak = 0
+            self._window_wait = 0.0
+            return window
+
+    def snapshot(self, pool=None):
+        with self._lock:
+            data = dict(
+                checkouts=self.checkouts,
+                timeouts=self.timeouts,
+                connects=self.connects,
+                wait_avg=self.wait_total / self.checkouts if self.checkouts else 0.0,
+                wait_max=self.wait_max,
+                age_max=self.age_max,
+                peak_checked_out=self.peak_checked_out,
+            )
+        if isinstance(pool, QueuePool):
+            data.update(
+                pool_size=pool.size(),
+                max_overflow=pool._max_overflow,  # pylint: disable=protected-access
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+            )
+        return data
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录checkout等待耗时及超时的QueuePool
+
+    pool_adaptive为True时，按评估窗口内的等待、超时及峰值占用在[0, 初始max_overflow]内调整max_overflow，
+    空闲时收缩溢出连接、繁忙时恢复，连接总数不超过初始配置
+    """
+
+    def __init__(self, creator, pool_stats=None, pool_adaptive=False, **kw):
+        super().__init__(creator, **kw)
+        self.pool_stats = pool_stats or PoolStats()
+        self.pool_adaptive = pool_adaptive
+        self._overflow_cap = self._max_overflow
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            self.pool_stats.on_timeout()
+            if self.pool_adaptive:
+                self._adapt(force=True)
+            raise
+        self.pool_stats.on_checkout(time.perf_counter() - start, self.checkedout())
+        if self.pool_adaptive and self.pool_stats.window_checkouts >= ADAPT_INTERVAL:
+            self._adapt()
+        return conn
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.pool_stats = self.pool_stats
+        pool.pool_adaptive = self.pool_adaptive
+        pool._overflow_cap = self._overflow_cap  # pylint: disable=protected-access
+        return pool
+
+    def _adapt(self, force=False):
+        checkouts, wait_avg, timeouts, peak = self.pool_stats.pop_window()
+        if not checkouts and not force:
+            return
+        max_overflow = self._max_overflow
+        if timeouts or wait_avg > ADAPT_WAIT_THRESHOLD:
+            max_overflow = min(max(max_overflow * 2, 1), self._overflow_cap)
+        elif peak < self.size() + max_overflow // 2:
+            max_overflow = max(max_overflow // 2, 0)
+        if max_overflow != self._max_overflow:
+            frame_log.info("pool max_overflow adapt:{}->{}|wait_avg:{}|timeouts:{}|peak:{}",
+                           self._max_overflow, max_overflow, wait_avg, timeouts, peak)
+            self._max_overflow = max_overflow
+
+
+def instrument_engine(engine):
+    """注册连接池事件: 连接创建次数、连接存活时长"""
+    pool = engine.pool
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_conn, connection_record):  # pylint: disable=unused-argument
+        connection_record.info["created_at"] = time.monotonic()
+        stats = getattr(engine.pool, "pool_stats", None)
+        if stats is not None:
+            stats.on_connect()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_conn, connection_record):  # pylint: disable=unused-argument
+        stats = getattr(engine.pool, "pool_stats", None)
+        created_at = connection_record.info.get("created_at") if connection_record else None
+        if stats is not None and created_at is not None:
+            stats.on_age(time.monotonic() - created_at)
+
+    return engine
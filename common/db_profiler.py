@@ -0,0 +1,166 @@
+# vim set fileencoding=utf-8
+"""sql性能分析模块"""
+import bisect
+import functools
+import re
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+
+from common.qt_logging import frame_log
+from common.request_context import Request as RequestContext
+
+DEFAULT_SLOW_THRESHOLD = 1.0  # 慢查询阈值(秒)
+DEFAULT_MAX_FINGERPRINTS = 1000  # 最多统计的sql指纹数
+# 耗时直方图分桶上界(秒)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+SLOW_PARAMS_LEN = 1000  # 慢查询日志中参数最大长度
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_IN_LIST_RE = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_RE = re.compile(r"\bvalues\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.I)
+_SPACE_RE = re.compile(r"\s+")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """sql指纹: 去除注释，字面量、绑定参数替换为?，IN列表及多行VALUES折叠，合并空白并转小写"""
+    sql = _COMMENT_RE.sub(" ", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("in (...)", sql)
+    sql = _VALUES_RE.sub(r"values \1, ...", sql)
+    return _SPACE_RE.sub(" ", sql).strip().lower()
+
+
+class FingerprintStats(object):
+    """单个(engine, sql指纹)的统计"""
+
+    __slots__ = ("engine", "fingerprint", "count", "total", "max", "rows", "slow",
+                 "buckets", "last_request")
+
+    def __init__(self, engine, sql_fingerprint):
+        self.engine = engine
+        self.fingerprint = sql_fingerprint
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.last_request = None
+
+    def as_dict(self):
+        return dict(
+            engine=self.engine,
+            fingerprint=self.fingerprint,
+            count=self.count,
+            total=self.total,
+            avg=self.total / self.count if self.count else 0.0,
+            max=self.max,
+            rows=self.rows,
+            slow=self.slow,
+            histogram=dict(zip(LATENCY_BUCKETS, self.buckets)),
+            last_request=self.last_request,
+        )
+
+
+class SqlProfiler(object):
+    """基于before/after_cursor_execute事件的sql耗时统计
+
+    按(engine名称, sql指纹)聚合耗时直方图、行数，超过slow_threshold的语句输出完整sql到慢查询日志
+    行数取cursor.rowcount，部分驱动(如sqlite)查询语句为-1时不计入
+    """
+
+    def __init__(self, slow_threshold=DEFAULT_SLOW_THRESHOLD, max_fingerprints=DEFAULT_MAX_FINGERPRINTS):
+        self.slow_threshold = slow_threshold
+        self.max_fingerprints = max_fingerprints
+        self.enabled = False  # 是否为新创建的engine注册事件
+        self.dropped = 0  # 超出max_fingerprints未统计的次数
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._engines = weakref.WeakKeyDictionary()  # engine -> engine名称
+
+    def attach(self, engine, name):
+        """为engine注册事件，重复注册忽略"""
+        if engine in self._engines:
+            return
+        self._engines[engine] = name
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def detach_all(self):
+        for engine in list(self._engines.keys()):
+            event.remove(engine, "before_cursor_execute", self._before_execute)
+            event.remove(engine, "after_cursor_execute", self._after_execute)
+            event.remove(engine, "handle_error", self._handle_error)
+        self._engines.clear()
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument
+        conn.info.setdefault("profiler_start", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument
+        starts = conn.info.get("profiler_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        name = self._engines.get(conn.engine)
+        if name is None:
+            # Engine.execution_options()等派生的OptionEngine，按其主engine计
+            name = self._engines.get(getattr(conn.engine, "_proxied", None), str(conn.engine.url))
+        self.record(name, statement, elapsed, cursor.rowcount, parameters)
+
+    @staticmethod
+    def _handle_error(context):
+        # 执行失败时不触发after_cursor_execute，弹出开始时间，避免后续语句错配耗时
+        conn = context.connection
+        if conn is not None and conn.info.get("profiler_start"):
+            conn.info["profiler_start"].pop()
+
+    def record(self, engine, statement, elapsed, rowcount=-1, parameters=None):
+        request = RequestContext.get()
+        key = (engine, fingerprint(statement))
+        slow = elapsed >= self.slow_threshold
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    self.dropped += 1
+                else:
+                    stats = self._stats[key] = FingerprintStats(*key)
+            if stats is not None:
+                stats.count += 1
+                stats.total += elapsed
+                stats.max = max(stats.max, elapsed)
+                stats.rows += max(rowcount or 0, 0)
+                stats.slow += slow
+                stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+                stats.last_request = request
+        if slow:
+            params = repr(parameters)
+            if len(params) > SLOW_PARAMS_LEN:
+                params = params[:SLOW_PARAMS_LEN] + "..."
+            frame_log.warning("slow sql({:.3f}s|rows:{}|engine:{}|request:{}): {}|params:{}",
+                              elapsed, rowcount, engine, request, statement, params)
+
+    def stats(self, top=None):
+        """按总耗时倒序返回各指纹统计"""
+        with self._lock:
+            data = [stats.as_dict() for stats in self._stats.values()]
+        data.sort(key=lambda item: item["total"], reverse=True)
+        return data[:top] if top else data
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+
+PROFILER = SqlProfiler()
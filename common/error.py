@@ -47,6 +47,7 @@ class QtError(object, metaclass=ErrorMeta):  # pylint: disable=too-few-public-me
     # other system error
     E_OTHER_BASE = (1500, 'other system error')
     E_CONNECT = (1501, 'connect other failed')
+    E_CIRCUIT_OPEN = (1502, 'circuit breaker open')
 
     # Model Data Count Error
     E_INSUFFICIENT_SAMPLES = (1600, "insufficient samples")
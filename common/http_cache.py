@@ -0,0 +1,234 @@
+# vim set fileencoding=utf-8
+"""http响应缓存模块"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from common.qt_logging import frame_log
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 默认内存上限
+DEFAULT_TTL = 0  # 响应无Cache-Control/Expires时的新鲜期(秒)，0表示仅带校验头时缓存并每次校验
+# 不参与缓存key的请求头(每次请求各不相同)，其余请求头(含username/secret等凭证)均参与
+DEFAULT_EXCLUDED_HEADERS = ("x-request-id",)
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since")
+
+# expire: 新鲜期截止(time.monotonic)
+CachedResponse = namedtuple(
+    "CachedResponse", ["status_code", "headers", "content", "etag", "last_modified", "expire", "nbytes"]
+)
+
+
+def parse_cache_control(value) -> dict:
+    """解析Cache-Control: "max-age=60, no-cache" -> {"max-age": "60", "no-cache": None}"""
+    directives = {}
+    for item in (value or "").split(","):
+        name, _, arg = item.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, default_ttl=DEFAULT_TTL):
+    """按Cache-Control max-age/Expires计算剩余新鲜期(秒)，扣除Age；不可缓存返回None"""
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    age = headers.get("age", "")
+    age = float(age) if age.isdigit() else 0.0
+    if directives.get("max-age", "").isdigit():
+        return max(float(directives["max-age"]) - age, 0.0)
+    expires = _http_date(headers.get("expires"))
+    if expires is not None:
+        date = _http_date(headers.get("date")) or time.time()
+        return max(expires - date - age, 0.0)
+    return float(default_ttl)
+
+
+class HttpCache(object):
+    """GET响应缓存(进程内)
+
+    按(url, 请求头)缓存响应，遵循Cache-Control(max-age/no-cache/no-store)及Expires，
+    过期后带If-None-Match/If-Modified-Since条件请求校验，304时复用缓存内容；按内存上限LRU淘汰
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, default_ttl=DEFAULT_TTL,
+                 excluded_headers=DEFAULT_EXCLUDED_HEADERS):
+        assert max_bytes > 0 and default_ttl >= 0
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.excluded_headers = frozenset(header.lower() for header in excluded_headers)
+        self.nbytes = 0
+        self.hits = 0  # 新鲜命中
+        self.revalidated = 0  # 条件请求返回304
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> CachedResponse
+        self._lock = threading.Lock()
+
+    def cache_key(self, url, headers=None) -> tuple:
+        return url, tuple(sorted((key.lower(), value) for key, value in (headers or {}).items()
+                                 if key.lower() not in self.excluded_headers))
+
+    def lookup(self, key):
+        """返回(缓存项, 是否新鲜)，未缓存返回(None, False)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._data.move_to_end(key)
+            if entry.expire > time.monotonic():
+                self.hits += 1
+                return entry, True
+            return entry, False
+
+    def store(self, key, resp: httpx.Response):
+        """缓存200响应，无新鲜期且无校验头的响应不缓存"""
+        if resp.status_code != 200 or resp.headers.get("vary", "").strip() == "*":
+            return None
+        lifetime = freshness_lifetime(resp.headers, self.default_ttl)
+        etag, last_modified = resp.headers.get("etag"), resp.headers.get("last-modified")
+        if lifetime is None or (not lifetime and not etag and not last_modified):
+            return None
+        content = resp.content
+        headers = list(resp.headers.multi_items())
+        nbytes = len(content) + sum(len(name) + len(value) for name, value in headers)
+        if nbytes > self.max_bytes:
+            frame_log.info("response too large to cache:{} bytes", nbytes)
+            return None
+        entry = CachedResponse(resp.status_code, headers, content, etag, last_modified,
+                               time.monotonic() + lifetime, nbytes)
+        with self._lock:
+            self._pop(key)
+            while self._data and self.nbytes + nbytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+            self._data[key] = entry
+            self.nbytes += nbytes
+        return entry
+
+    def refresh(self, key, entry: CachedResponse, resp: httpx.Response):
+        """304响应: 合并新的缓存相关响应头并更新新鲜期"""
+        headers = httpx.Headers(entry.headers)
+        for name in ("cache-control", "expires", "date", "etag", "last-modified", "age"):
+            if name in resp.headers:
+                headers[name] = resp.headers[name]
+        lifetime = freshness_lifetime(headers, self.default_ttl)
+        entry = entry._replace(headers=list(headers.multi_items()), etag=headers.get("etag"),
+                               last_modified=headers.get("last-modified"),
+                               expire=time.monotonic() + (lifetime or 0.0))
+        with self._lock:
+            self.revalidated += 1
+            if key in self._data:
+                self._data[key] = entry
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: CachedResponse) -> dict:
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    @staticmethod
+    def to_response(entry: CachedResponse, method, url) -> httpx.Response:
+        return httpx.Response(entry.status_code, headers=entry.headers, content=entry.content,
+                              request=httpx.Request(method, url))
+
+    def invalidate(self, url):
+        """失效url对应的所有缓存项"""
+        with self._lock:
+            for key in [key for key in self._data if key[0] == url]:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(entries=len(self._data), nbytes=self.nbytes, hits=self.hits,
+                        revalidated=self.revalidated, misses=self.misses, evictions=self.evictions)
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
+
+
+HTTP_CACHE = HttpCache()
+
+
+def configure(max_bytes=DEFAULT_MAX_BYTES, default_ttl=DEFAULT_TTL, excluded_headers=DEFAULT_EXCLUDED_HEADERS):
+    """重新设置响应缓存参数(清空已有缓存)"""
+    global HTTP_CACHE  # pylint: disable=global-statement
+    HTTP_CACHE = HttpCache(max_bytes, default_ttl, excluded_headers)
+
+
+def is_conditional(headers) -> bool:
+    """调用方自行携带If-None-Match/If-Modified-Since的条件请求"""
+    return any(key.lower() in CONDITIONAL_HEADERS for key in headers or {})
+
+
+def _prepare(url, headers):
+    """返回(缓存, key, 缓存项, 是否新鲜)，请求声明no-store或调用方自行条件请求时不使用缓存"""
+    cache = HTTP_CACHE
+    directives = parse_cache_control(httpx.Headers(headers or {}).get("cache-control"))
+    if "no-store" in directives or is_conditional(headers):
+        return None, None, None, False
+    key = cache.cache_key(url, headers)
+    entry, fresh = cache.lookup(key)
+    return cache, key, entry, fresh and "no-cache" not in directives
+
+
+def _finish(cache, key, entry, resp, url):
+    if entry is not None and resp.status_code == 304:
+        return cache.to_response(cache.refresh(key, entry, resp), "GET", url)
+    cache.store(key, resp)
+    return resp
+
+
+def cached_request(send, url, headers=None):
+    """带缓存的GET请求-同步
+
+    :param send: send(headers)发送请求并返回httpx.Response
+    """
+    cache, key, entry, fresh = _prepare(url, headers)
+    if cache is None:
+        return send(headers)
+    if fresh:
+        return cache.to_response(entry, "GET", url)
+    if entry is not None:
+        headers = dict(headers or {}, **cache.conditional_headers(entry))
+    return _finish(cache, key, entry, send(headers), url)
+
+
+async def async_cached_request(send, url, headers=None):
+    """带缓存的GET请求-异步，send(headers)返回awaitable"""
+    cache, key, entry, fresh = _prepare(url, headers)
+    if cache is None:
+        return await send(headers)
+    if fresh:
+        return cache.to_response(entry, "GET", url)
+    if entry is not None:
+        headers = dict(headers or {}, **cache.conditional_headers(entry))
+    return _finish(cache, key, entry, await send(headers), url)
+
+
+def stats():
+    return HTTP_CACHE.stats()
@@ -0,0 +1,135 @@
+# vim set fileencoding=utf-8
+"""http请求合并(single-flight)模块"""
+import asyncio
+import hashlib
+import json
+import threading
+import weakref
+
+from common import http_retry
+
+EXCLUDED_HEADERS = frozenset(("x-request-id",))  # 不参与合并key的请求头(每次请求各不相同)
+
+
+def _body_digest(data):
+    """请求体摘要，流式请求体返回False表示不可合并"""
+    if data is None:
+        return None
+    if isinstance(data, str):
+        data = data.encode()
+    elif isinstance(data, (dict, list, tuple)):
+        data = json.dumps(data, sort_keys=True, default=str).encode()
+    if not isinstance(data, (bytes, bytearray)):
+        return False
+    return hashlib.sha1(data).hexdigest()
+
+
+def request_key(method, url, headers=None, data=None, coalesce=False):
+    """合并key: (method, 完整url, 请求头, 请求体摘要)，不可合并时返回None
+
+    除X-Request-Id外的所有请求头均参与key，携带不同凭证(Authorization、X-Api-Token等)的请求不合并
+    :param coalesce: True合并幂等请求(GET/HEAD/PUT等或携带Idempotency-Key)，False不合并
+    """
+    method = (method or "GET").upper()
+    if not coalesce or not http_retry.is_idempotent(method, headers):
+        return None
+    digest = _body_digest(data)
+    if digest is False:
+        return None
+    headers = tuple(sorted((key.lower(), value) for key, value in (headers or {}).items()
+                           if key.lower() not in EXCLUDED_HEADERS))
+    return (method, url, headers, digest)
+
+
+class _Call(object):
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """相同key的并发调用只执行一次，其余调用等待并共享结果(或异常)
+
+    同步调用跨线程合并；异步调用按事件循环合并，执行在独立task中，个别调用方取消不影响其他调用方
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0  # 被合并(未实际执行)的调用数
+        self._calls = {}
+        self._async_calls = weakref.WeakKeyDictionary()  # loop -> {key: task}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    async def async_do(self, key, func):
+        """func为无参协程函数"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.calls += 1
+            calls = self._async_calls.setdefault(loop, {})
+            task = calls.get(key)
+            if task is None:
+                task = calls[key] = asyncio.ensure_future(func())
+                task.add_done_callback(lambda done: self._done(calls, key, done))
+            else:
+                self.shared += 1
+        return await asyncio.shield(task)
+
+    def _done(self, calls, key, task):
+        with self._lock:
+            if calls.get(key) is task:
+                del calls[key]
+        if not task.cancelled():
+            task.exception()  # 调用方均已取消时避免未获取异常的告警
+
+    def stats(self):
+        with self._lock:
+            inflight = len(self._calls) + sum(len(calls) for calls in self._async_calls.values())
+            return dict(calls=self.calls, shared=self.shared, inflight=inflight,
+                        ratio=self.shared / self.calls if self.calls else 0.0)
+
+    def reset(self):
+        with self._lock:
+            self.calls = self.shared = 0
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+def do(key, func):
+    return SINGLE_FLIGHT.do(key, func)
+
+
+async def async_do(key, func):
+    return await SINGLE_FLIGHT.async_do(key, func)
+
+
+def stats():
+    return SINGLE_FLIGHT.stats()
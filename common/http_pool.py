@@ -0,0 +1,180 @@
+# vim set fileencoding=utf-8
+"""http连接池模块"""
+import asyncio
+import atexit
+import http.cookiejar
+import importlib.util
+import os
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from common.qt_logging import frame_log
+
+# max_connections: 单个host最大连接数
+# max_keepalive_connections: 单个host最大空闲保活连接数
+# keepalive_expiry: 空闲连接保活时间(秒)
+# http2: 是否启用HTTP/2(需安装h2)
+HttpPoolCfg = namedtuple(
+    "HttpPoolCfg", ["max_connections", "max_keepalive_connections", "keepalive_expiry", "http2"]
+)
+
+DEFAULT_POOL_CFG = HttpPoolCfg(100, 20, 5.0, False)
+
+
+def _no_cookie_jar():
+    """共享客户端不保存响应Set-Cookie，避免会话、凭证在不相关的调用方之间泄漏"""
+    return http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=()))
+
+
+class ClientRegistry(object):
+    """按(scheme, host, port, proxy)复用httpx客户端
+
+    同步Client线程安全，进程内共享；AsyncClient绑定事件循环，按事件循环分别创建，
+    事件循环shutdown_asyncgens(asyncio.run结束)时关闭，其他方式关闭的事件循环在下次获取时释放；
+    fork后的子进程重新创建
+    """
+
+    def __init__(self):
+        self._default_cfg = DEFAULT_POOL_CFG
+        self._host_cfgs = {}
+        self._clients = {}
+        # AsyncClient持有事件循环的强引用，不能用弱引用字典随事件循环回收
+        self._async_clients = {}  # loop -> {key: AsyncClient}
+        self._loop_guards = {}  # loop -> 事件循环结束时关闭AsyncClient的异步生成器
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def configure(self, host=None, **kwargs):
+        """设置连接池参数，host为None时设置默认参数，已创建的客户端不受影响
+
+        >>> registry.configure(max_connections=200, http2=True)
+        >>> registry.configure("api.example.com", max_keepalive_connections=50)
+        """
+        with self._lock:
+            if host is None:
+                self._default_cfg = self._default_cfg._replace(**kwargs)
+            else:
+                self._host_cfgs[host] = self._host_cfgs.get(host, self._default_cfg)._replace(**kwargs)
+
+    def _client_kwargs(self, host, proxy):
+        cfg = self._host_cfgs.get(host, self._default_cfg)
+        http2 = cfg.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            frame_log.warning("http2 need h2 installed, fallback to http/1.1")
+            http2 = False
+        limits = httpx.Limits(max_connections=cfg.max_connections,
+                              max_keepalive_connections=cfg.max_keepalive_connections,
+                              keepalive_expiry=cfg.keepalive_expiry)
+        return dict(limits=limits, http2=http2, proxies=proxy, cookies=_no_cookie_jar())
+
+    @staticmethod
+    def client_key(url, proxy=None):
+        parts = urlsplit(url)
+        return parts.scheme, parts.hostname, parts.port, proxy
+
+    def _check_fork(self):
+        # 子进程不可复用父进程的连接
+        if self._pid != os.getpid():
+            self._clients = {}
+            self._async_clients = {}
+            self._loop_guards = {}
+            self._pid = os.getpid()
+
+    def _release_closed_loops(self):
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            self._async_clients.pop(loop)
+            self._loop_guards.pop(loop, None)
+
+    async def _close_on_shutdown(self, loop):
+        """事件循环关闭前由shutdown_asyncgens结束，关闭该事件循环的AsyncClient"""
+        try:
+            yield
+        finally:
+            with self._lock:
+                clients = self._async_clients.pop(loop, {})
+                self._loop_guards.pop(loop, None)
+            for client in clients.values():
+                await client.aclose()
+
+    def get_client(self, url, proxy=None) -> httpx.Client:
+        key = self.client_key(url, proxy)
+        client = self._clients.get(key)
+        if client is None or client.is_closed or self._pid != os.getpid():
+            with self._lock:
+                self._check_fork()
+                client = self._clients.get(key)
+                if client is None or client.is_closed:
+                    client = httpx.Client(**self._client_kwargs(key[1], proxy))
+                    self._clients[key] = client
+                    frame_log.info("http client created:{}", key)
+        return client
+
+    def get_async_client(self, url, proxy=None) -> httpx.AsyncClient:
+        """获取当前事件循环的AsyncClient，需在协程中调用"""
+        key = self.client_key(url, proxy)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._check_fork()
+            clients = self._async_clients.get(loop)
+            if clients is None:
+                self._release_closed_loops()
+                clients = self._async_clients[loop] = {}
+                guard = self._loop_guards[loop] = self._close_on_shutdown(loop)
+                try:
+                    # 执行至yield，由事件循环的asyncgen钩子登记
+                    guard.__anext__().send(None)
+                except StopIteration:
+                    pass
+            client = clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(**self._client_kwargs(key[1], proxy))
+                clients[key] = client
+                frame_log.info("http async client created:{}", key)
+        return client
+
+    def close(self):
+        """关闭同步客户端"""
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    async def aclose(self):
+        """关闭当前事件循环的AsyncClient，在应用shutdown事件中调用"""
+        with self._lock:
+            loop = asyncio.get_running_loop()
+            clients = self._async_clients.pop(loop, {})
+            guard = self._loop_guards.pop(loop, None)
+        if guard is not None:
+            await guard.aclose()
+        for client in clients.values():
+            await client.aclose()
+
+    def stats(self):
+        with self._lock:
+            self._release_closed_loops()
+            return dict(clients=len(self._clients),
+                        async_clients=sum(len(clients) for clients in self._async_clients.values()))
+
+
+CLIENTS = ClientRegistry()
+atexit.register(CLIENTS.close)
+
+
+def configure(host=None, **kwargs):
+    CLIENTS.configure(host, **kwargs)
+
+
+def get_client(url, proxy=None) -> httpx.Client:
+    return CLIENTS.get_client(url, proxy)
+
+
+def get_async_client(url, proxy=None) -> httpx.AsyncClient:
+    return CLIENTS.get_async_client(url, proxy)
+
+
+async def aclose():
+    await CLIENTS.aclose()
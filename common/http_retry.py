@@ -0,0 +1,272 @@
+# vim set fileencoding=utf-8
+"""http重试及熔断模块"""
+import asyncio
+import random
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from common.error import QtError, QtException
+from common.qt_logging import frame_log
+
+# retries: 最大重试次数
+# backoff: 退避基数(秒)，第n次重试前在[0, min(max_backoff, backoff * 2^n)]内随机等待
+# max_backoff: 单次退避上限(秒)
+# retry_statuses: 可重试的响应状态码
+RetryPolicy = namedtuple("RetryPolicy", ["retries", "backoff", "max_backoff", "retry_statuses"])
+
+DEFAULT_RETRY_POLICY = RetryPolicy(2, 0.1, 2.0, frozenset((502, 503, 504)))
+NO_RETRY = DEFAULT_RETRY_POLICY._replace(retries=0)
+
+# failure_threshold: 连续失败次数达到该值时熔断
+# reset_timeout: 熔断持续时间(秒)，之后进入半开状态放行探测请求
+# half_open_max: 半开状态最多同时放行的探测请求数
+BreakerCfg = namedtuple("BreakerCfg", ["failure_threshold", "reset_timeout", "half_open_max"])
+
+DEFAULT_BREAKER_CFG = BreakerCfg(5, 30.0, 1)
+
+RETRY_BUDGET_RATIO = 0.2  # 每个请求为重试预算增加的额度，即重试量不超过请求量的20%
+RETRY_BUDGET_MIN = 10.0  # 重试预算初始额度
+RETRY_BUDGET_MAX = 100.0  # 重试预算上限
+
+# 计入熔断失败的响应状态码(网关/服务不可用)，应用返回的500等错误说明host可达，不计入
+BREAKER_STATUSES = frozenset((502, 503, 504))
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"))
+IDEMPOTENCY_HEADER = "idempotency-key"
+# 请求未发出即失败的异常，非幂等请求也可重试
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def is_idempotent(method, headers=None):
+    """幂等方法或携带Idempotency-Key的请求可安全重试"""
+    if (method or "GET").upper() in IDEMPOTENT_METHODS:
+        return True
+    return any(key.lower() == IDEMPOTENCY_HEADER for key in headers or {})
+
+
+class RetryBudget(object):
+    """重试预算: 每个请求存入ratio额度，每次重试消耗1，下游整体故障时避免重试放大流量"""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, initial=RETRY_BUDGET_MIN, limit=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.limit = limit
+        self.tokens = initial
+        self.exhausted = 0  # 预算不足放弃重试的次数
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.tokens + self.ratio, self.limit)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+class CircuitBreaker(object):
+    """单个host的熔断器
+
+    closed: 连续失败(连接异常、5xx)达到failure_threshold次后转为open
+    open: 请求直接抛出E_CIRCUIT_OPEN，reset_timeout后转为half_open
+    half_open: 最多放行half_open_max个探测请求，成功转为closed，失败重新open
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, host, cfg=DEFAULT_BREAKER_CFG):
+        self.host = host
+        self.cfg = cfg
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self.opened_at = 0.0
+        self.budget = RetryBudget()
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """请求前调用，熔断时抛出QtException(E_CIRCUIT_OPEN)"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cfg.reset_timeout:
+                frame_log.info("circuit breaker half open:{}", self.host)
+                self.state = self.HALF_OPEN
+                self._probes = 0
+            if self.state == self.OPEN or (self.state == self.HALF_OPEN
+                                           and self._probes >= self.cfg.half_open_max):
+                self.rejected += 1
+                raise QtException(QtError.E_CIRCUIT_OPEN, f"{self.host}: circuit breaker open")
+            if self.state == self.HALF_OPEN:
+                self._probes += 1
+
+    def release(self):
+        """请求未得出结果(如被取消)时归还探测名额"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+
+    def on_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                frame_log.info("circuit breaker closed:{}", self.host)
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probes = 0
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED
+                                                and self.failures >= self.cfg.failure_threshold):
+                frame_log.warning("circuit breaker open:{}|failures:{}", self.host, self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(state=self.state, failures=self.failures, rejected=self.rejected,
+                        retry_tokens=self.budget.tokens, retry_exhausted=self.budget.exhausted)
+
+
+class BreakerRegistry(object):
+    """按host(netloc)管理熔断器，同步、异步请求共用"""
+
+    def __init__(self):
+        self.cfg = DEFAULT_BREAKER_CFG
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        """设置熔断参数，对已创建的熔断器同样生效"""
+        with self._lock:
+            self.cfg = self.cfg._replace(**kwargs)
+            for breaker in self._breakers.values():
+                breaker.cfg = self.cfg
+
+    def get(self, url) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(host, CircuitBreaker(host, self.cfg))
+        return breaker
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.host: breaker.stats() for breaker in breakers}
+
+    def reset(self):
+        with self._lock:
+            self._breakers.clear()
+
+
+BREAKERS = BreakerRegistry()
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _after_attempt(breaker, policy, attempt, method, headers, resp, err):
+    """记录本次结果，返回重试前的等待时间，不重试时返回None"""
+    if err is not None or resp.status_code in BREAKER_STATUSES:
+        breaker.on_failure()
+    else:
+        breaker.on_success()
+    if err is not None:
+        retry = isinstance(err, _UNSENT_ERRORS) or is_idempotent(method, headers)
+    else:
+        retry = resp.status_code in policy.retry_statuses and is_idempotent(method, headers)
+    if not retry or attempt >= policy.retries or breaker.state == breaker.OPEN:
+        return None
+    if not breaker.budget.withdraw():
+        frame_log.warning("retry budget exhausted:{}", breaker.host)
+        return None
+    delay = random.uniform(0, min(policy.max_backoff, policy.backoff * 2 ** attempt))
+    retry_after = _retry_after(resp) if resp is not None else None
+    if retry_after is not None:
+        delay = min(max(delay, retry_after), policy.max_backoff)
+    frame_log.warning("retry {}/{} after {:.3f}s:{}|{}", attempt + 1, policy.retries, delay,
+                      breaker.host, err if err is not None else resp.status_code)
+    return delay
+
+
+def request_with_retry(send, url, method, headers=None, policy=None):
+    """按重试策略及host熔断器执行请求-同步
+
+    :param send: 无参函数，发送请求并返回httpx.Response
+    :param policy: RetryPolicy，默认DEFAULT_RETRY_POLICY
+    仅重试连接异常、超时及policy.retry_statuses，非幂等请求只重试未发出的请求；
+    重试用尽后返回最后一次的响应或抛出最后一次的异常
+    :raise QtException(E_CIRCUIT_OPEN): 熔断中
+    """
+    policy = policy or DEFAULT_RETRY_POLICY
+    breaker = BREAKERS.get(url)
+    breaker.budget.deposit()
+    attempt = 0
+    while True:
+        breaker.acquire()
+        resp = err = None
+        try:
+            resp = send()
+        except httpx.TransportError as exc:
+            err = exc
+        except BaseException:
+            breaker.release()
+            raise
+        delay = _after_attempt(breaker, policy, attempt, method, headers, resp, err)
+        if delay is None:
+            if err is not None:
+                raise err
+            return resp
+        if resp is not None:
+            resp.close()  # 流式响应需释放连接
+        time.sleep(delay)
+        attempt += 1
+
+
+async def async_request_with_retry(send, url, method, headers=None, policy=None):
+    """按重试策略及host熔断器执行请求-异步，send返回awaitable，其余同request_with_retry"""
+    policy = policy or DEFAULT_RETRY_POLICY
+    breaker = BREAKERS.get(url)
+    breaker.budget.deposit()
+    attempt = 0
+    while True:
+        breaker.acquire()
+        resp = err = None
+        try:
+            resp = await send()
+        except httpx.TransportError as exc:
+            err = exc
+        except BaseException:
+            breaker.release()
+            raise
+        delay = _after_attempt(breaker, policy, attempt, method, headers, resp, err)
+        if delay is None:
+            if err is not None:
+                raise err
+            return resp
+        if resp is not None:
+            await resp.aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def configure_breaker(**kwargs):
+    BREAKERS.configure(**kwargs)
+
+
+def breaker_stats():
+    return BREAKERS.stats()
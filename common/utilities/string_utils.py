@@ -42,6 +42,17 @@ def get_tbname_from_sql(sql_string):
     return table_name
 
 
+def get_tbnames_from_sql(sql_string):
+    """sql中获取所有引用的表名(FROM/JOIN及FROM后逗号分隔的表)，统一小写、去除引号"""
+    sql = re.sub(r"\s+", " ", sql_string)
+    names = re.findall(r"\b(?:FROM|JOIN) ([^\s,();]+)", sql, re.I)
+    for tables in re.findall(
+            r"\bFROM ([^();]+?)(?= WHERE | GROUP | ORDER | LIMIT | HAVING | UNION |"
+            r" (?:LEFT |RIGHT |INNER |FULL |CROSS |OUTER )*JOIN |\)|;|$)", sql, re.I):
+        names.extend(table.split()[0] for table in tables.split(",") if table.strip())
+    return {name.strip('"`[]').lower() for name in names}
+
+
 def pascal_case_to_snake_case(camel_case: str):
     """大驼峰（帕斯卡）转蛇形"""
     snake_case = re.sub(r"(?P<key>[A-Z]+)", r"_\g<key>", camel_case)
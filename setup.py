@@ -41,6 +41,8 @@ setup(
         "pytest-mock",
         "pytest-cover",
         "pytest-asyncio==0.20.3",
+        "aiosqlite",
+        "pyarrow",
         "testfixtures",
     ],
     classifiers=[
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""cgi_request连接复用吞吐基准
+
+本地HTTP/1.1 keep-alive服务，对比每次请求新建httpx客户端(改造前)与按host复用连接池
+python -m tests.benchmark.bench_cgi_request_pool
+"""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from loguru import logger
+
+from common.client import async_cgi_request, cgi_request
+
+NUMBER = 2000
+CONCURRENCY = 50
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1  # 响应头、响应体一次写出，避免Nagle与延迟确认叠加
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        body = b'{"code": 0}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def legacy_request(url):
+    """改造前: 每次请求新建Client"""
+    with httpx.Client() as client:
+        return client.request("GET", url, timeout=5).read()
+
+
+async def legacy_async_request(url):
+    async with httpx.AsyncClient() as client:
+        return (await client.request("GET", url, timeout=5)).read()
+
+
+def _sync_rps(func, url):
+    start = time.perf_counter()
+    for _ in range(NUMBER):
+        func(url)
+    return NUMBER / (time.perf_counter() - start)
+
+
+def _async_rps(func, url):
+    async def _run():
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def _one():
+            async with semaphore:
+                await func(url)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[_one() for _ in range(NUMBER)])
+        return NUMBER / (time.perf_counter() - start)
+
+    return asyncio.run(_run())
+
+
+def main():
+    logger.remove()  # 只统计请求耗时
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/ping"
+    cases = {
+        "sync_new_client": lambda: _sync_rps(legacy_request, url),
+        "sync_pooled": lambda: _sync_rps(cgi_request, url),
+        "async_new_client": lambda: _async_rps(legacy_async_request, url),
+        "async_pooled": lambda: _async_rps(async_cgi_request, url),
+    }
+    for name, case in cases.items():
+        print(f"{name:<18} {case():>8.0f} req/s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
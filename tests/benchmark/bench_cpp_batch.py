@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""cpp_request逐行调用与cpp_batch_request批量调用耗时基准
+
+30k持仓逐行估值(含20%重复输入)，日志输出到文件以计入格式化及写入开销
+python -m tests.benchmark.bench_cpp_batch
+"""
+import os
+import tempfile
+import time
+
+import numpy
+import pandas
+from loguru import logger
+
+from common.client import cpp_batch_request, cpp_request
+from tests.common import fake_qtlib
+
+ROWS = 30000
+
+
+def _positions():
+    rng = numpy.random.default_rng(0)
+    frame = pandas.DataFrame({
+        "face": rng.choice([100.0, 1000.0], ROWS),
+        "rate": rng.integers(1, 1000, ROWS) / 10000,
+        "years": rng.integers(1, 30, ROWS),
+    })
+    frame.iloc[::5] = frame.iloc[0]
+    return frame
+
+
+def _loop(frame):
+    return [cpp_request(fake_qtlib.price, face, rate, years=years, executor="inline")
+            for face, rate, years in frame.itertuples(index=False, name=None)]
+
+
+def _loop_pool(frame):
+    return [cpp_request(fake_qtlib.price, face, rate, years=years)
+            for face, rate, years in frame.itertuples(index=False, name=None)]
+
+
+def main():
+    frame = _positions()
+    with tempfile.TemporaryDirectory() as path:
+        logger.remove()
+        logger.add(os.path.join(path, "bench.log"))
+        cases = [
+            ("loop_inline", _loop),
+            ("loop_thread_pool", _loop_pool),
+            ("batch_thread", lambda data: cpp_batch_request(fake_qtlib.price, data)),
+            ("batch_no_memo", lambda data: cpp_batch_request(fake_qtlib.price, data, memo=False)),
+            ("batch_process", lambda data: cpp_batch_request(fake_qtlib.price, data, executor="process")),
+        ]
+        for name, func in cases:
+            start = time.perf_counter()
+            func(frame)
+            print(f"{name:<20}{time.perf_counter() - start:8.3f}s")
+
+
+if __name__ == '__main__':
+    main()
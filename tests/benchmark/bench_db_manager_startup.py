@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""db_manager启动耗时、内存基准
+
+配置20个mysql_*库，在独立子进程中分别测量导入耗时、获取engine耗时及最大常驻内存:
+import: 仅导入common.db_manager(不加载配置、不创建engine)
+first_engine: 导入后获取一个库的engine(加载配置并创建该库engine)
+all_engines: 导入后获取全部库的engine(等同改造前导入即全部创建)
+python -m tests.benchmark.bench_db_manager_startup
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SECTIONS = 20
+REPEAT = 5
+
+CASE_CODE = """
+import json, resource, time
+start = time.perf_counter()
+import common.db_manager as db_manager
+imported = time.perf_counter()
+for name in {names}:
+    db_manager.DBManager.get_instance(name).engine
+done = time.perf_counter()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps([imported - start, done - imported, rss]))
+"""
+
+
+def _write_conf(path):
+    lines = ["[app_env]", "run_env = bench", ""]
+    for idx in range(SECTIONS):
+        lines += [f"[mysql_db{idx}]", f"db_name = db{idx}", "user = bench", "passwd = bench",
+                  "host = 127.0.0.1", "port = 3306", ""]
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines))
+
+
+def _run_case(names, conf):
+    env = dict(os.environ, CONF=conf)
+    code = CASE_CODE.format(names=repr(names))
+    results = []
+    for _ in range(REPEAT):
+        output = subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return [min(values) for values in zip(*results)]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        conf = os.path.join(path, "bench.conf")
+        _write_conf(conf)
+        cases = {
+            "import": [],
+            "first_engine": ["db0"],
+            "all_engines": [f"db{idx}" for idx in range(SECTIONS)],
+        }
+        for name, names in cases.items():
+            import_cost, engine_cost, rss = _run_case(names, conf)
+            print(f"{name:<14} import {import_cost * 1e3:>7.1f} ms  engines {engine_cost * 1e3:>7.1f} ms"
+                  f"  max rss {rss / 2 ** 20:>6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
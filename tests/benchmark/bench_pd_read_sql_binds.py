@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""pd_read_sql重复参数化查询耗时基准
+
+对比literal_binds编译(每次生成不同sql文本)与绑定参数执行(命中编译缓存)
+python -m tests.benchmark.bench_pd_read_sql_binds
+"""
+import timeit
+
+import pandas
+import sqlalchemy as db
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from common.db_manager import Base, DeclarMixin, pd_read_sql
+
+ROWS = 100000
+NUMBER = 500
+
+
+class Quote(Base, DeclarMixin):
+    __tablename__ = "tb_bench_quote"
+    code = db.Column(db.String(20), primary_key=True)
+    price = db.Column(db.Float)
+    volume = db.Column(db.Integer)
+
+
+def legacy_read_sql(query, session):
+    """旧实现: literal_binds编译为sql文本后查询"""
+    sql = query.statement.compile(dialect=session.bind.dialect,
+                                  compile_kwargs={"literal_binds": True})
+    return pandas.read_sql(sql=str(sql), con=session.bind)
+
+
+def main():
+    engine = db.create_engine("sqlite://", poolclass=StaticPool,
+                              connect_args={"check_same_thread": False})
+    Quote.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(Quote.__table__.insert(), [
+            {"code": f"{idx:06d}", "price": idx * 0.01, "volume": idx} for idx in range(ROWS)
+        ])
+    session = Session(bind=engine)
+    codes = iter(f"{idx * 7 % ROWS:06d}" for idx in range(NUMBER * 20))
+
+    def _query():
+        return session.query(Quote).filter(Quote.code == next(codes), Quote.volume > 0)
+
+    cases = {
+        "literal_binds": lambda: legacy_read_sql(_query(), session),
+        "bound_params": lambda: pd_read_sql(_query(), session=session),
+    }
+    for name, stmt in cases.items():
+        cost = min(timeit.repeat(stmt, number=NUMBER, repeat=3)) / NUMBER
+        print(f"{name:<14} {cost * 1e6:>8.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""session_decorate单次调用开销基准
+
+对比每次调用都做inspect.getcallargs/inspect.signature的旧实现与装饰时预解析参数的新实现
+python -m tests.benchmark.bench_session_decorate
+"""
+import inspect
+import timeit
+
+from sqlalchemy.orm.session import Session
+
+from common.db_manager import session_decorate
+
+NUMBER = 100000
+
+
+def legacy_session_decorate(func):
+    """旧实现(仅保留Session对象传入分支)"""
+
+    def _wrapper(*args, **kwargs):
+        call_args = inspect.getcallargs(func, *args, **kwargs)
+        session = call_args.get("session")
+        if isinstance(session, Session):
+            return func(*args, **kwargs)
+        raise RuntimeError(f"unsupport session:{session}|{type(session)}")
+
+    return _wrapper
+
+
+def query(cls, filters, expunge=True, load_attrs=None, session="default"):
+    return session
+
+
+def main():
+    session = Session()
+    cases = {
+        "raw": query,
+        "legacy": legacy_session_decorate(query),
+        "current": session_decorate(query),
+    }
+    for call in ("keyword", "positional"):
+        for name, func in cases.items():
+            if call == "keyword":
+                stmt = lambda: func(None, [], session=session)  # pylint: disable=cell-var-from-loop
+            else:
+                stmt = lambda: func(None, [], True, None, session)  # pylint: disable=cell-var-from-loop
+            cost = min(timeit.repeat(stmt, number=NUMBER, repeat=5)) / NUMBER
+            print(f"{call:<10} {name:<8} {cost * 1e9:>8.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# vim set fileencoding=utf-8
+"""pytest配置
+
+部署时common包位于qt_quant.common下，db_manager按该路径导入；
+未安装qt_quant时将qt_quant.common指向本仓库的common包，保证db相关单元测试可执行
+"""
+import importlib
+import sys
+import types
+
+try:
+    import qt_quant.common  # pylint: disable=unused-import
+except ImportError:
+    import common
+
+    qt_quant = types.ModuleType("qt_quant")
+    qt_quant.common = common
+    sys.modules["qt_quant"] = qt_quant
+    sys.modules["qt_quant.common"] = common
+    # 子模块使用同一模块对象，避免按两个名称重复加载(如两份ConfigManager)
+    for name in ("config", "db_cache", "db_fetch", "db_pool", "db_profiler", "qt_logging"):
+        sys.modules[f"qt_quant.common.{name}"] = importlib.import_module(f"common.{name}")
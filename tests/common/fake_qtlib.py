@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""qtlib纯python替身，用于cpp_request测试(进程模式需可被子进程导入)"""
+import math
+import os
+import time
+
+
+def price(face, rate, years=1):
+    return face / (1 + rate) ** years
+
+
+def slow_price(delay, value=1.0):
+    time.sleep(delay)
+    return value
+
+
+def invalid_price():
+    return math.nan
+
+
+def failed_price(msg):
+    raise ValueError(msg)
+
+
+def worker_pid():
+    return os.getpid()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""client 单元测试"""
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+from common import http_coalesce, http_pool, http_retry
+from common.client import (async_cgi_batch, async_cgi_request, async_cgi_request_iter, async_cgi_stream,
+                           async_jsonl_decoder, cgi_download, cgi_request, cgi_stream, csv_decoder, iter_lines,
+                           jsonl_decoder)
+from common.error import QtError, QtException
+from common.request_context import Request as RequestContext
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    active = 0
+    peak = 0
+    unavailable = 0
+    lock = threading.Lock()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        query = parse.parse_qs(parse.urlsplit(self.path).query)
+        time.sleep(float(query.get("delay", [0])[0]))
+        with cls.lock:
+            cls.active -= 1
+        if self.path.startswith("/jsonl") or self.path.startswith("/csv"):
+            if self.path.startswith("/jsonl"):
+                body = b"".join(json.dumps({"id": idx}).encode() + b"\n" for idx in range(1000))
+            else:
+                body = b"id,name\r\n" + b"".join(b'%d,"a\r\nb"\r\n' % idx for idx in range(1000))
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.startswith("/error") or self.path.startswith("/unavailable"):
+            if self.path.startswith("/unavailable"):
+                with cls.lock:
+                    cls.unavailable += 1
+            self.send_response(503 if self.path.startswith("/unavailable") else 500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"path": self.path, "request_id": self.headers.get("X-Request-Id"),
+                           "cookie": self.headers.get("Cookie")}).encode()
+        self.send_response(200)
+        if self.path.startswith("/login"):
+            self.send_header("Set-Cookie", "session=user_a_token; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class _ServerTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    @staticmethod
+    def _run(coro):
+        async def _main():
+            try:
+                return await coro
+            finally:
+                await http_pool.aclose()
+        return asyncio.run(_main())
+
+
+class TestCgiBatch(_ServerTestCase):
+
+    def test_batch_ordered(self):
+        specs = [{"url": f"{self.url}/a", "delay": 0.05 * (3 - idx)} for idx in range(3)]
+        specs.append(f"{self.url}/error")
+        specs.append({"url": "http://127.0.0.1:1/a", "timeout": 1})
+
+        async def _batch():
+            RequestContext.set("req-1")
+            return await async_cgi_batch(specs, decoder=json.loads)
+
+        results = self._run(_batch())
+        self.assertEqual([item.index for item in results], [0, 1, 2, 3, 4])
+        self.assertEqual(results[0].result["request_id"], "req-1")
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[3].result)
+        self.assertEqual(results[3].error.error, QtError.E_OTHER_BASE)
+        self.assertEqual(results[4].error.error, QtError.E_CONNECT)
+
+    def test_host_concurrency(self):
+        _Handler.peak = 0
+        specs = [{"url": f"{self.url}/a", "delay": 0.05, "id": idx} for idx in range(12)]
+
+        async def _iter():
+            return [item.index async for item in async_cgi_request_iter(specs, concurrency=6, host_concurrency=2)]
+
+        indexes = self._run(_iter())
+        self.assertEqual(sorted(indexes), list(range(12)))
+        self.assertLessEqual(_Handler.peak, 2)
+
+    def test_coalesce(self):
+        _Handler.peak = 0
+        specs = [{"url": f"{self.url}/a", "delay": 0.1, "coalesce": True}] * 5 + [{"url": f"{self.url}/a",
+                                                                                  "delay": 0.1}]
+        before = http_coalesce.stats()
+        results = self._run(async_cgi_batch(specs, decoder=json.loads))
+        after = http_coalesce.stats()
+        self.assertEqual(len({id(item.result) for item in results}), 6)  # 各调用方分别decoder
+        self.assertEqual(after["shared"] - before["shared"], 4)
+        self.assertEqual(_Handler.peak, 2)
+
+    def test_coalesce_headers(self):
+        # 携带不同凭证的请求不合并
+        _Handler.peak = 0
+        specs = [{"url": f"{self.url}/a", "delay": 0.1, "coalesce": True, "headers": {"X-Api-Token": token}}
+                 for token in ("alice", "bob") for _ in range(2)]
+        before = http_coalesce.stats()
+        self._run(async_cgi_batch(specs, decoder=json.loads))
+        self.assertEqual(http_coalesce.stats()["shared"] - before["shared"], 2)
+        self.assertEqual(_Handler.peak, 2)
+
+
+class TestCgiRequest(_ServerTestCase):
+
+    def test_no_cookie_persistence(self):
+        # 连接池共享客户端，上一次调用返回的Set-Cookie不能带到下一次调用
+        cgi_request(f"{self.url}/login", "GET")
+        self.assertIsNone(cgi_request(f"{self.url}/a", "GET", decoder=json.loads)["cookie"])
+
+        async def _request():
+            await async_cgi_request(f"{self.url}/login", "GET")
+            return await async_cgi_request(f"{self.url}/a", "GET", decoder=json.loads)
+
+        self.assertIsNone(self._run(_request())["cookie"])
+
+    def test_no_retry_by_default(self):
+        # 默认不重试，需显式传入retry_policy
+        _Handler.unavailable = 0
+        with self.assertRaises(QtException):
+            cgi_request(f"{self.url}/unavailable", "GET")
+        self.assertEqual(_Handler.unavailable, 1)
+        policy = http_retry.RetryPolicy(1, 0.001, 0.01, frozenset((503,)))
+        with self.assertRaises(QtException):
+            cgi_request(f"{self.url}/unavailable", "GET", retry_policy=policy)
+        self.assertEqual(_Handler.unavailable, 3)
+        http_retry.BREAKERS.reset()
+
+
+class TestCgiStream(_ServerTestCase):
+
+    def test_iter_lines(self):
+        chunks = [b'{"a": 1}\n{"a"', b": 2}\r", b'\n\n{"a": 3}']
+        self.assertEqual(list(iter_lines(chunks)), [b'{"a": 1}\n', b'{"a": 2}\r\n', b"\n", b'{"a": 3}'])
+        self.assertEqual([item["a"] for item in jsonl_decoder(chunks)], [1, 2, 3])
+
+    def test_stream_records(self):
+        records = list(jsonl_decoder(cgi_stream(f"{self.url}/jsonl", "GET", chunk_size=100)))
+        self.assertEqual([item["id"] for item in records], list(range(1000)))
+        rows = list(csv_decoder(cgi_stream(f"{self.url}/csv", "GET", chunk_size=7)))
+        self.assertEqual(len(rows), 1000)
+        self.assertEqual(rows[-1], {"id": "999", "name": "a\r\nb"})
+        # 提前退出
+        stream = cgi_stream(f"{self.url}/jsonl", "GET", chunk_size=10)
+        self.assertEqual(len(next(stream)), 10)
+        stream.close()
+
+    def test_download(self):
+        buffer = io.BytesIO()
+        nbytes = cgi_download(f"{self.url}/jsonl", buffer, req_method="GET")
+        self.assertEqual(nbytes, len(buffer.getvalue()))
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, "data.jsonl")
+            self.assertEqual(cgi_download(f"{self.url}/jsonl", path), nbytes)
+            self.assertEqual(os.path.getsize(path), nbytes)
+
+    def test_async_stream(self):
+        async def _records():
+            return [item["id"] async for item in async_jsonl_decoder(async_cgi_stream(f"{self.url}/jsonl"))]
+
+        self.assertEqual(self._run(_records()), list(range(1000)))
+        with self.assertRaises(QtException) as ctx:
+            self._run(async_cgi_stream(f"{self.url}/error").__anext__())
+        self.assertEqual(ctx.exception.error, QtError.E_OTHER_BASE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""cpp_request 单元测试"""
+import asyncio
+import math
+import time
+import unittest
+
+import pandas as pd
+
+from common import cpp_pool
+from common.client import async_cpp_request, cpp_batch_request, cpp_request
+from common.error import QtError, QtException
+from tests.common import fake_qtlib
+
+
+class TestCppRequest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cpp_pool.configure(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cpp_pool.configure()
+
+    def test_cpp_request(self):
+        self.assertAlmostEqual(cpp_request(fake_qtlib.price, 100, 0.05, years=2), 90.7029, 4)
+        self.assertEqual(cpp_request(fake_qtlib.price, 100, 0.0, decoder=int, executor="inline"), 100)
+        self.assertIsNone(cpp_request(fake_qtlib.invalid_price))
+        with self.assertRaises(QtException) as ctx:
+            cpp_request(fake_qtlib.failed_price, "bad curve")
+        self.assertEqual(ctx.exception.error, QtError.E_CONNECT)
+        self.assertIn("bad curve", ctx.exception.msg)
+
+    def test_thread_timeout(self):
+        start = time.perf_counter()
+        with self.assertRaises(QtException) as ctx:
+            cpp_request(fake_qtlib.slow_price, 0.5, timeout=0.1)
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertIn("timed out", ctx.exception.msg)
+        self.assertGreaterEqual(cpp_pool.stats()["abandoned"], 1)
+
+    def test_process_timeout(self):
+        pid = cpp_request(fake_qtlib.worker_pid, executor="process")
+        self.assertEqual(cpp_request(fake_qtlib.worker_pid, executor="process"), pid)
+        with self.assertRaises(QtException) as ctx:
+            cpp_request(fake_qtlib.slow_price, 10, timeout=0.2, executor="process")
+        self.assertIn("timed out", ctx.exception.msg)
+        self.assertGreaterEqual(cpp_pool.stats()["killed"], 1)
+        # 超时的子进程已结束，重新创建子进程
+        self.assertEqual(cpp_request(fake_qtlib.slow_price, 0, 2.0, executor="process"), 2.0)
+        with self.assertRaises(QtException):
+            cpp_request(fake_qtlib.failed_price, "bad curve", executor="process")
+
+    def test_async_cpp_request(self):
+        async def _main():
+            ticks = 0
+
+            async def _ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.ensure_future(_ticker())
+            result = await async_cpp_request(fake_qtlib.slow_price, 0.2, 3.0)
+            with self.assertRaises(QtException):
+                await async_cpp_request(fake_qtlib.slow_price, 0.5, timeout=0.1)
+            ticker.cancel()
+            return result, ticks
+
+        result, ticks = asyncio.run(_main())
+        self.assertEqual(result, 3.0)
+        self.assertGreater(ticks, 10)  # 执行期间事件循环未被阻塞
+
+    def test_async_cancel_process(self):
+        async def _main():
+            task = asyncio.ensure_future(async_cpp_request(fake_qtlib.slow_price, 10, executor="process"))
+            await asyncio.sleep(1)
+            task.cancel()
+            start = time.perf_counter()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return time.perf_counter() - start
+
+        killed = cpp_pool.stats()["killed"]
+        self.assertLess(asyncio.run(_main()), 1)
+        time.sleep(0.2)
+        self.assertEqual(cpp_pool.stats()["killed"], killed + 1)
+
+
+class TestCppBatchRequest(unittest.TestCase):
+
+    def test_dataframe(self):
+        frame = pd.DataFrame({"face": [100, 100, 200, 100], "rate": [0.05, 0.05, 0.0, 0.1],
+                              "years": [1, 1, 2, 1]}, index=["a", "b", "c", "d"])
+        calls = []
+
+        def pricer(face, rate, years=1):
+            calls.append(face)
+            return fake_qtlib.price(face, rate, years)
+
+        result = cpp_batch_request(pricer, frame, chunksize=2, workers=2)
+        self.assertEqual(list(result.index), ["a", "b", "c", "d"])
+        self.assertEqual(list(result["result"].round(4)), [95.2381, 95.2381, 200.0, 90.9091])
+        self.assertTrue(result["error"].isna().all())
+        self.assertEqual(len(calls), 3)  # 重复输入只计算一次
+        # 按columns取位置参数，公共关键字参数
+        result = cpp_batch_request(fake_qtlib.price, frame, columns=["face", "rate"], years=0, decoder=int)
+        self.assertEqual(list(result["result"]), [100, 100, 200, 100])
+
+    def test_errors(self):
+        def pricer(value):
+            if value < 0:
+                raise ValueError("negative")
+            return math.nan if value == 0 else value
+
+        memo = {}
+        result = cpp_batch_request(pricer, [1, -1, 0, (2,), {"value": 3}], chunksize=2, memo=memo)
+        self.assertEqual(list(result["result"].iloc[[0, 3, 4]]), [1, 2, 3])
+        self.assertTrue(pd.isna(result["result"].iloc[2]))
+        self.assertIsNone(result["error"].iloc[0])
+        self.assertEqual(result["error"].iloc[1].error, QtError.E_CONNECT)
+        self.assertEqual(len(memo), 5)
+        # 批次间复用memo
+        result = cpp_batch_request(pricer, [1, 2], memo=memo)
+        self.assertEqual(list(result["result"]), [1, 2])
+        self.assertEqual(len(memo), 5)
+        # 不同接口共用memo时不命中其他接口的结果
+        result = cpp_batch_request(lambda value: value * 10, [1, 2], memo=memo)
+        self.assertEqual(list(result["result"]), [10, 20])
+        self.assertEqual(len(memo), 7)
+
+    def test_arguments(self):
+        with self.assertRaises(ValueError):
+            cpp_batch_request(fake_qtlib.price, [(100, 0.05)], chunksize=0)
+        with self.assertRaises(ValueError):
+            cpp_batch_request(fake_qtlib.price, [(100, 0.05)], workers=0)
+        with self.assertRaises(ValueError):
+            cpp_batch_request(fake_qtlib.price, [(100, 0.05)], executor="fork")
+
+    def test_thread_timeout(self):
+        # 块数超过workers时逐批提交，排队的块不计入超时
+        result = cpp_batch_request(fake_qtlib.slow_price, [(0.2, idx) for idx in range(4)], chunksize=1,
+                                   workers=2, timeout=0.3, executor="thread", memo=False)
+        self.assertEqual(list(result["result"]), [0, 1, 2, 3])
+        self.assertTrue(result["error"].isna().all())
+
+    def test_process(self):
+        frame = pd.DataFrame({"face": [100.0] * 50, "rate": [idx / 100 for idx in range(50)]})
+        result = cpp_batch_request(fake_qtlib.price, frame, chunksize=10, workers=2, executor="process")
+        self.assertAlmostEqual(result["result"].iloc[10], 100 / 1.1)
+        # 块超时时块内各行均失败，其余块正常
+        result = cpp_batch_request(fake_qtlib.slow_price, [(0,), (0,), (1,)], chunksize=2,
+                                   timeout=0.5, executor="process", memo=False)
+        self.assertEqual(list(result["error"].isna()), [True, True, False])
+        result = cpp_batch_request(fake_qtlib.slow_price, [(0.01,), (1,), (0,)], chunksize=2,
+                                   timeout=0.5, executor="process", memo=False)
+        self.assertEqual(list(result["error"].isna()), [False, False, True])
+        self.assertIn("timed out", result["error"].iloc[0].msg)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""db fetch 单元测试"""
+import sqlite3
+import unittest
+
+import numpy
+
+from common.db_fetch import fetch_columnar
+
+
+class TestFetchColumnar(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("create table tb (i integer, f real, n integer, s text)")
+        self.conn.executemany("insert into tb values (?, ?, ?, ?)",
+                              [(idx, idx / 2, None if idx % 2 else idx, f"s{idx}") for idx in range(7)])
+
+    def tearDown(self) -> None:
+        self.conn.close()
+
+    def test_fetch_columnar(self):
+        result = fetch_columnar(self.conn.execute("select * from tb"), batch_size=3)
+        self.assertEqual([str(dtype) for dtype in result.dtypes], ["int64", "float64", "float64", "object"])
+        self.assertEqual(result["n"].isna().sum(), 3)
+        self.assertEqual(result["s"].tolist(), [f"s{idx}" for idx in range(7)])
+
+    def test_fetch_dtypes(self):
+        result = fetch_columnar(self.conn.execute("select i, f, n from tb"), batch_size=3,
+                                dtypes={"i": "int32", "f": "float32", "n": "int64"})
+        self.assertEqual([str(dtype) for dtype in result.dtypes], ["int32", "float32", "Int64"])
+        self.assertTrue(numpy.array_equal(result["f"].to_numpy(), numpy.arange(7, dtype="float32") / 2))
+
+    def test_fetch_empty(self):
+        result = fetch_columnar(self.conn.execute("select * from tb where i < 0"))
+        self.assertEqual(list(result.columns), ["i", "f", "n", "s"])
+        self.assertEqual(len(result), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
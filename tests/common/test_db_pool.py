@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""db pool 单元测试"""
+import os
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, text
+
+from common import db_pool
+
+
+class TestDBPool(unittest.TestCase):
+
+    def test_default_pool_paras(self):
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "4", "DB_MAX_CONNECTIONS": "40"}):
+            self.assertEqual(db_pool.default_pool_paras(), {"pool_size": 5, "max_overflow": 5})
+
+    def test_pool_stats(self):
+        engine = db_pool.instrument_engine(create_engine(
+            "sqlite://", poolclass=db_pool.InstrumentedQueuePool, pool_size=2, max_overflow=4,
+            pool_adaptive=True))
+        for _ in range(db_pool.ADAPT_INTERVAL):
+            with engine.connect() as conn:
+                conn.execute(text("select 1"))
+        stats = engine.pool.pool_stats.snapshot(engine.pool)
+        self.assertEqual(stats["checkouts"], db_pool.ADAPT_INTERVAL)
+        self.assertEqual(stats["connects"], 1)
+        self.assertEqual(stats["checked_out"], 0)
+        # 空闲时收缩溢出连接
+        self.assertEqual(stats["max_overflow"], 2)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
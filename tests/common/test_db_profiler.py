@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""db profiler 单元测试"""
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from common.db_profiler import SqlProfiler, fingerprint
+from common.request_context import Request
+
+
+class TestSqlProfiler(unittest.TestCase):
+
+    def test_fingerprint(self):
+        sql = "SELECT * FROM tb WHERE name = 'it''s' AND id IN (1, 2,3) /* hint */ AND age > %(age)s"
+        self.assertEqual(fingerprint(sql), "select * from tb where name = ? and id in (...) and age > ?")
+        self.assertEqual(fingerprint("insert into tb values (1, 'a'), (2, 'b')"),
+                         "insert into tb values (?, ?), ...")
+
+    def test_profile(self):
+        profiler = SqlProfiler(slow_threshold=0)
+        engine = create_engine("sqlite://")
+        profiler.attach(engine, "test")
+        token = Request.set("request_id")
+        try:
+            with engine.connect() as conn:
+                for idx in range(3):
+                    conn.execute(text(f"select {idx}"))
+        finally:
+            Request.reset(token)
+        stats = profiler.stats()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]["engine"], "test")
+        self.assertEqual(stats[0]["count"], 3)
+        self.assertEqual(stats[0]["slow"], 3)
+        self.assertEqual(sum(stats[0]["histogram"].values()), 3)
+        self.assertEqual(stats[0]["last_request"], "request_id")
+        profiler.detach_all()
+        with engine.connect() as conn:
+            conn.execute(text("select 1"))
+        self.assertEqual(profiler.stats()[0]["count"], 3)
+
+    def test_error(self):
+        profiler = SqlProfiler()
+        engine = create_engine("sqlite://")
+        profiler.attach(engine, "test")
+        with engine.connect() as conn:
+            with self.assertRaises(OperationalError):
+                conn.execute(text("select * from tb_missing"))
+            self.assertFalse(conn.info.get("profiler_start"))
+            conn.execute(text("select 1"))
+        self.assertEqual(profiler.stats()[0]["count"], 1)
+        profiler.detach_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""db manager 单元测试(sqlite)"""
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import pandas
+import sqlalchemy as db
+from sqlalchemy.dialects import postgresql
+
+from common.db_manager import (AsyncDBManager, Base, DBCfg, DBManager, DeclarMixin, _CaseFolded, _compile_sql,
+                               _merge_table, _onupdate_values, _text_rows, async_pd_read_sql, pd_read_sql,
+                               pd_read_sql_partitioned, pd_read_sql_stream, pd_to_sql)
+
+
+class People(Base):
+    __abstract__ = True
+    name = db.Column(db.String(50), primary_key=True, comment="姓名")
+    age = db.Column(db.INTEGER(), comment="年龄")
+
+
+class Student(People, DeclarMixin):
+    __tablename__ = "tb_student"
+
+
+class Teacher(People, DeclarMixin):
+    __tablename__ = "tb_teacher"
+
+
+class Course(Base, DeclarMixin):
+    __tablename__ = "tb_course"
+    name = db.Column(db.String(50), primary_key=True, comment="课程")
+    teacher = db.Column(db.String(50), comment="教师")
+    hours = db.Column(db.INTEGER(), comment="课时")
+    status = db.Column(db.String(20), default="created", onupdate="updated", comment="状态")
+
+
+class _SqliteManager(DBManager):
+    """sqlite文件库: host作为文件名"""
+    PATH = tempfile.mkdtemp()
+
+    @classmethod
+    def engine_url(cls, name, db_cfg):
+        return f"sqlite:///{os.path.join(cls.PATH, db_cfg.host)}.db"
+
+
+def _sqlite_cfg(host, **engine_para):
+    # 连接池中的连接会在不同线程间复用
+    engine_para["connect_args"] = {"check_same_thread": False}
+    return DBCfg("sqlite", "", "", "", host, 0, "", engine_para)
+
+
+def setUpModule():
+    DBManager._INSTANCES["sqlite"] = _SqliteManager("sqlite", _sqlite_cfg("default"))
+
+
+def tearDownModule():
+    DBManager._INSTANCES.pop("sqlite").engine.dispose()
+
+
+class _SqliteTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.manager = DBManager.get_instance("sqlite")
+        for table in (Student.__table__, Teacher.__table__, Course.__table__):
+            table.drop(self.manager.engine, checkfirst=True)
+            table.create(self.manager.engine)
+
+    def _count(self, table):
+        return pd_read_sql(f"select count(*) as num from {table}", session="sqlite").iloc[0, 0]
+
+
+class TestReadSql(_SqliteTestCase):
+
+    def test_read_query(self):
+        data = [['Google', 10], ['Runoob', 12], ['Wiki', 13]]
+        pd_to_sql(pandas.DataFrame(data, columns=["name", "age"]), tb=Student, session="sqlite",
+                  if_exists="append")
+        with self.manager.session_open() as session:
+            for age in (10, 12):
+                query = session.query(Student).filter(Student.age > age)
+                result = pd_read_sql(query, session=session)
+                self.assertEqual(len(result), len([item for item in data if item[1] > age]))
+
+    def test_case_fold(self):
+        table = db.Table("TB_CASE", db.MetaData(), db.Column("ID", db.Integer), db.Column("Name", db.String))
+        sql = _compile_sql(db.select(table).where(table.c.ID == 1), postgresql.psycopg2.dialect())
+        self.assertEqual(str(sql.compile(dialect=postgresql.psycopg2.dialect())).split(),
+                         "SELECT TB_CASE.ID, TB_CASE.Name FROM TB_CASE WHERE TB_CASE.ID = %(ID_1)s".split())
+        # 按原engine执行，重复执行命中编译缓存
+        data = pandas.DataFrame([['Google', 10], ['Wiki', 13]], columns=["name", "age"])
+        pd_to_sql(data, tb=Student, session="sqlite", if_exists="append")
+        with self.manager.session_open() as session:
+            for age, num in ((9, 2), (10, 1)):
+                query = _CaseFolded(session.query(Student).filter(Student.age > age).statement)
+                self.assertEqual(len(pandas.read_sql(query, session.bind)), num)
+
+    def test_read_sql_columnar(self):
+        data = [['Google', 10], ['Runoob', None], ['Wiki', 13]]
+        pd_to_sql(pandas.DataFrame(data, columns=["name", "age"]), tb=Student, session="sqlite",
+                  if_exists="append")
+        sql = "select name, age from tb_student order by name"
+        expected = pd_read_sql(sql, session="sqlite")
+        pandas.testing.assert_frame_equal(pd_read_sql(sql, session="sqlite", columnar=True), expected)
+        result = pd_read_sql(sql, session="sqlite", columnar=True, dtypes={"age": "int64"})
+        self.assertEqual(str(result["age"].dtype), "Int64")
+
+    def test_read_sql_stream(self):
+        records = [{"name": f"name_{idx}", "age": idx} for idx in range(25)]
+        Student.batch_insert(records, session="sqlite")
+        chunks = list(pd_read_sql_stream("select * from tb_student", session="sqlite", chunksize=10,
+                                         decoder=lambda df: df.head(8)))
+        self.assertEqual([len(chunk) for chunk in chunks], [8, 8, 5])
+
+    @unittest.skipUnless(importlib.util.find_spec("qtlib"), "time_utils need qtlib")
+    def test_read_sql_partitioned(self):
+        start = datetime.datetime(2024, 1, 1)
+        data = pandas.DataFrame({"ts": [start + datetime.timedelta(hours=idx) for idx in range(72)],
+                                 "px": range(72)})
+        data.to_sql("tb_tick", self.manager.engine, if_exists="replace", index=False)
+        sql = "select px from tb_tick where ts >= :start_time and ts < :end_time"
+        result = pd_read_sql_partitioned(sql, "2024-01-01 00:00:00", "2024-01-04 00:00:00",
+                                         session="sqlite", max_workers=2, retries=1)
+        self.assertEqual(result["px"].tolist(), list(range(72)))
+
+    def test_cache_invalidate_on_commit(self):
+        sql = "select count(*) as num from tb_teacher where name='Cache'"
+        self.assertEqual(pd_read_sql(sql, session="sqlite", cache=True).iloc[0, 0], 0)
+        with self.manager.session_open() as session:
+            Teacher(name="Cache", age=1).add(session=session)
+            # 提交前缓存仍有效
+            self.assertEqual(pd_read_sql(sql, session=session, cache=True).iloc[0, 0], 0)
+        self.assertEqual(pd_read_sql(sql, session="sqlite", cache=True).iloc[0, 0], 1)
+
+
+class TestWrite(_SqliteTestCase):
+
+    def test_to_sql(self):
+        data = pandas.DataFrame([['Google', 10], ['Runoob', 12]], columns=["name", "age"])
+        for _ in range(2):
+            self.assertEqual(pd_to_sql(data, tb_name="tb_people", session="sqlite"), (2, 0))
+        self.assertEqual(self._count("tb_people"), 2)
+        pd_to_sql(data, tb_name="tb_people", session="sqlite", if_exists="append")
+        self.assertEqual(self._count("tb_people"), 4)
+
+    def test_bulk_load(self):
+        data = pandas.DataFrame([[f"name_{idx}", idx] for idx in range(25)], columns=["name", "age"])
+        pd_to_sql(data, tb_name="tb_people", session="sqlite", bulk_load=True, chunksize=10)
+        self.assertEqual(self._count("tb_people"), 25)
+
+    def test_bulk_load_session(self):
+        # 建表与导入在session同一连接(同一事务)中执行
+        data = pandas.DataFrame([[f"name_{idx}", idx] for idx in range(5)], columns=["name", "age"])
+        with self.manager.session_open() as session:
+            for _ in range(2):
+                pd_to_sql(data, tb_name="tb_people", session=session, bulk_load=True)
+            self.assertEqual(session.execute(db.text("select count(*) from tb_people")).scalar(), 5)
+        self.assertEqual(self._count("tb_people"), 5)
+
+    def test_bulk_load_text(self):
+        # 空值写为\N，空字符串、"NULL"及含转义字符的字符串原样保留
+        data = pandas.DataFrame({"name": ["", None, "NULL", "\\N", "a\tb\nc"], "age": [1, None, 3, 4, 5]})
+        self.assertEqual(_text_rows(data).split("\n")[:-1],
+                         ["\t1.0", "\\N\t\\N", "NULL\t3.0", "\\\\N\t4.0", "a\\tb\\nc\t5.0"])
+
+    def test_append_model(self):
+        # 指定tb追加写入时，表名及列名以模型为准(不受upper_or_lower影响)
+        data = pandas.DataFrame([["Google", 10], ["Runoob", 12]], columns=["NAME", "Age"])
+        self.assertEqual(pd_to_sql(data, tb=Teacher, session="sqlite", if_exists="append"), (2, 0))
+        self.assertEqual(list(data.columns), ["name", "age"])
+        data = pandas.DataFrame([[f"name_{idx}", idx] for idx in range(5)], columns=["name", "age"])
+        pd_to_sql(data, tb=Teacher, session="sqlite", if_exists="append", bulk_load=True, chunksize=2)
+        self.assertEqual(self._count("tb_teacher"), 7)
+        with self.assertRaises(ValueError):
+            pd_to_sql(pandas.DataFrame({"name": ["Wiki"], "level": [1]}), tb=Teacher, session="sqlite",
+                      if_exists="append")
+
+    def test_upsert(self):
+        data = pandas.DataFrame([["Google", 10], ["Runoob", 12]], columns=["name", "age"])
+        pd_to_sql(data, tb=Teacher, session="sqlite", if_exists="upsert")
+        data = pandas.DataFrame([["Google", 11], ["Wiki", 13]], columns=["name", "age"])
+        result = pd_to_sql(data, tb=Teacher, session="sqlite", if_exists="upsert", chunksize=1)
+        self.assertEqual(result, (1, 1))
+        result = pd_read_sql("select age from tb_teacher where name='Google'", session="sqlite")
+        self.assertEqual(result.iloc[0, 0], 11)
+
+    def test_batch_insert(self):
+        data = pandas.DataFrame([[f"name_{idx}", idx] for idx in range(25)], columns=["name", "age"])
+        with self.assertRaises(ValueError):
+            Teacher.batch_insert(data, session="sqlite", workers=2)
+        result = Teacher.batch_insert(data, session="sqlite", chunksize=10, workers=2, partial_commit=True)
+        self.assertEqual((result.rows, result.rowcount), (25, 25))
+        self.assertEqual([chunk.rows for chunk in result.chunks], [10, 10, 5])
+        records = ({"name": f"name_{idx}", "age": idx} for idx in range(25, 30))
+        self.assertEqual(Teacher.batch_insert(records, session="sqlite", chunksize=2).rows, 5)
+        result = Teacher.batch_insert({"name": "name_30", "age": 30}, session="sqlite")
+        self.assertEqual((result.rows, result.rowcount), (1, 1))
+        # 忽略的重复行不计入rowcount
+        records = [{"name": "name_30", "age": 30}, {"name": "name_31", "age": 31}]
+        result = Teacher.batch_insert(records, prefixes=["OR IGNORE"], session="sqlite")
+        self.assertEqual((result.rows, result.rowcount), (2, 1))
+        self.assertEqual(self._count("tb_teacher"), 32)
+
+    def test_batch_merge(self):
+        Teacher.batch_merge([Teacher(name="merge_0", age=1), {"name": "merge_1", "age": 2}],
+                            session="sqlite")
+        result = Teacher.batch_merge([{"name": "merge_1", "age": 3}, Teacher(name="merge_2", age=4)],
+                                     chunksize=1, session="sqlite")
+        self.assertEqual(result, (1, 1))
+        self.assertEqual(Teacher.query_one([Teacher.name == "merge_1"], session="sqlite").age, 3)
+        # 同主键按输入顺序合并，后出现的列值覆盖(写入列不同也不打乱顺序)
+        result = Course.batch_merge([{"name": "math", "teacher": "Google"},
+                                     {"name": "math", "teacher": "Runoob", "hours": 10},
+                                     {"name": "math", "teacher": "Wiki"}], session="sqlite")
+        self.assertEqual(result, (1, 0))
+        course = Course.query_one([Course.name == "math"], session="sqlite")
+        self.assertEqual((course.teacher, course.hours), ("Wiki", 10))
+
+    def test_batch_merge_onupdate(self):
+        Course.batch_merge([{"name": "math", "teacher": "Google"}], session="sqlite")
+        self.assertEqual(Course.query_one([Course.name == "math"], session="sqlite").status, "created")
+        Course.batch_merge([{"name": "math", "hours": 10}, {"name": "math", "teacher": "Wiki"}],
+                           session="sqlite")
+        course = Course.query_one([Course.name == "math"], session="sqlite")
+        self.assertEqual((course.teacher, course.hours, course.status), ("Wiki", 10, "updated"))
+        # 原生upsert(pg/mysql)的更新部分按批次补充onupdate值
+        table = _merge_table(Course, ("hours", "name"))
+        self.assertEqual(_onupdate_values(table, ["name"], ["hours"]), {"status": "updated"})
+        self.assertEqual(_onupdate_values(table, ["name"], ["hours", "status"]), {})
+
+    def test_query_dicts(self):
+        Teacher.batch_insert([{"name": f"dict_{idx}", "age": idx} for idx in range(5)], session="sqlite")
+        filters = [Teacher.name.like("dict_%")]
+        expected = sorted((item.as_dict(jsonable=True) for item in Teacher.query(filters, session="sqlite")),
+                          key=lambda item: item["name"])
+        self.assertEqual(sorted(Teacher.query_dicts(filters, jsonable=True, session="sqlite"),
+                                key=lambda item: item["name"]), expected)
+        self.assertEqual(len(Teacher.query_df(filters, columns=["age"], session="sqlite")), 5)
+        self.assertEqual(len(list(Teacher.query_iter(filters, batch_size=2, session="sqlite"))), 5)
+
+    def test_read_your_writes(self):
+        with self.manager.session_open() as session:
+            Teacher(name="Baidu", age=20).add(session=session)
+            with session.read_your_writes():
+                result = Teacher.query_one([Teacher.name == "Baidu"], session=session)
+            self.assertEqual(result.age, 20)
+
+
+class TestReplicaRouting(unittest.TestCase):
+    """从库延迟(未同步主库数据)时，写入方法及事务内写入后的查询走主库"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.manager = DBManager._INSTANCES["routing"] = _SqliteManager(
+            "routing", _sqlite_cfg("primary", replica_hosts="replica"))
+        for engine in [cls.manager.engine] + cls.manager.replicas:
+            Teacher.__table__.create(engine, checkfirst=True)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        DBManager._INSTANCES.pop("routing")
+
+    def setUp(self) -> None:
+        with self.manager.engine.begin() as conn:
+            conn.execute(Teacher.__table__.delete())
+            conn.execute(Teacher.__table__.insert(), [{"name": "Google", "age": 10}])
+
+    def _primary_age(self, name):
+        with self.manager.engine.connect() as conn:
+            return conn.execute(db.select(Teacher.age).where(Teacher.name == name)).scalar()
+
+    def test_replica_read(self):
+        self.assertIsNone(Teacher.query_one([Teacher.name == "Google"], session="routing"))
+
+    def test_merge(self):
+        Teacher(name="Google", age=11).merge(session="routing")
+        self.assertEqual(self._primary_age("Google"), 11)
+        result = Teacher.batch_merge([{"name": "Google", "age": 12}], session="routing")
+        self.assertEqual(result, (0, 1))
+        self.assertEqual(self._primary_age("Google"), 12)
+
+    def test_read_after_write(self):
+        with self.manager.session_open() as session:
+            Teacher(name="Wiki", age=13).add(session=session)
+            session.flush()
+            result = Teacher.query_one([Teacher.name == "Wiki"], session=session)
+            self.assertEqual(result.age, 13)
+        # 提交后的新事务恢复读从库
+        with self.manager.session_open() as session:
+            self.assertIsNone(Teacher.query_one([Teacher.name == "Wiki"], session=session))
+
+
+class TestAsyncDBManager(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        AsyncDBManager.register("aiosqlite", "sqlite+aiosqlite:///:memory:")
+        engine = AsyncDBManager.get_instance("aiosqlite").engine
+        async with engine.begin() as conn:
+            await conn.run_sync(Student.__table__.create)
+        async with AsyncDBManager.get_instance("aiosqlite").session_open() as session:
+            session.add_all([Student(name="Google", age=10), Student(name="Wiki", age=13)])
+
+    async def asyncTearDown(self) -> None:
+        await AsyncDBManager._INSTANCES.pop("aiosqlite").engine.dispose()
+
+    async def test_async_query(self):
+        result = await Student.async_query([Student.age > 10], session="aiosqlite")
+        self.assertEqual([item.name for item in result], ["Wiki"])
+        result = await Student.async_query_one([Student.name == "Google"], session="aiosqlite")
+        self.assertEqual(result.age, 10)
+
+    async def test_async_read_sql(self):
+        result = await async_pd_read_sql("select * from tb_student", session="aiosqlite")
+        self.assertEqual(len(result), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
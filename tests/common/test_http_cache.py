@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""http cache 单元测试"""
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from common import http_cache, http_pool
+from common.client import async_cgi_request, cgi_request
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        type(self).requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path.startswith("/etag") and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b"curve"
+        self.send_response(200)
+        if self.path.startswith("/etag"):
+            self.send_header("ETag", '"v1"')
+            self.send_header("Cache-Control", "no-cache")
+        elif self.path.startswith("/fresh"):
+            self.send_header("Cache-Control", "max-age=60")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestHttpCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        http_cache.configure()
+        _Handler.requests = []
+
+    def test_freshness_lifetime(self):
+        self.assertEqual(http_cache.freshness_lifetime(httpx.Headers({"Cache-Control": "max-age=60"})), 60)
+        self.assertEqual(http_cache.freshness_lifetime(httpx.Headers({"Cache-Control": "max-age=60",
+                                                                      "Age": "10"})), 50)
+        self.assertEqual(http_cache.freshness_lifetime(httpx.Headers({"Cache-Control": "no-cache"})), 0)
+        self.assertIsNone(http_cache.freshness_lifetime(httpx.Headers({"Cache-Control": "no-store"})))
+        headers = httpx.Headers({"Date": "Mon, 01 Jan 2024 00:00:00 GMT",
+                                 "Expires": "Mon, 01 Jan 2024 00:02:00 GMT"})
+        self.assertEqual(http_cache.freshness_lifetime(headers), 120)
+        self.assertEqual(http_cache.freshness_lifetime(httpx.Headers(), default_ttl=5), 5)
+
+    def test_max_age(self):
+        for _ in range(3):
+            self.assertEqual(cgi_request(f"{self.url}/fresh", "GET", use_cache=True), "curve")
+        self.assertEqual(len(_Handler.requests), 1)
+        self.assertEqual(http_cache.stats()["hits"], 2)
+        # 缓存key包含请求头
+        cgi_request(f"{self.url}/fresh", "GET", headers={"Accept": "text/csv"}, use_cache=True)
+        self.assertEqual(len(_Handler.requests), 2)
+        # 不同凭证不共享缓存
+        for user in ("alice", "bob", "alice"):
+            cgi_request(f"{self.url}/fresh", "GET", headers={"username": user, "secret": user}, use_cache=True)
+        self.assertEqual(len(_Handler.requests), 4)
+        # 未启用缓存
+        cgi_request(f"{self.url}/fresh", "GET")
+        self.assertEqual(len(_Handler.requests), 5)
+
+    def test_etag_revalidate(self):
+        async def _request():
+            try:
+                return await async_cgi_request(f"{self.url}/etag", "GET", use_cache=True)
+            finally:
+                await http_pool.aclose()
+
+        self.assertEqual(cgi_request(f"{self.url}/etag", "GET", use_cache=True), "curve")
+        self.assertEqual(asyncio.run(_request()), "curve")
+        self.assertEqual(_Handler.requests, [("/etag", None), ("/etag", '"v1"')])
+        self.assertEqual(http_cache.stats()["revalidated"], 1)
+
+    def test_conditional_request(self):
+        # 调用方自行条件请求: 不使用缓存，直接返回304
+        cgi_request(f"{self.url}/etag", "GET", use_cache=True)
+        resp_header = {}
+        self.assertEqual(cgi_request(f"{self.url}/etag", "GET", headers={"If-None-Match": '"v1"'},
+                                     resp_header=resp_header, use_cache=True), "")
+        self.assertEqual(resp_header["etag"], '"v1"')
+        self.assertEqual(http_cache.stats()["revalidated"], 0)
+
+    def test_lru(self):
+        cache = http_cache.HttpCache(max_bytes=200, default_ttl=60)
+        for idx in range(3):
+            resp = httpx.Response(200, content=b"x" * 80, request=httpx.Request("GET", f"http://svc/{idx}"))
+            cache.store(cache.cache_key(f"http://svc/{idx}"), resp)
+        self.assertIsNone(cache.lookup(cache.cache_key("http://svc/0"))[0])
+        self.assertTrue(cache.lookup(cache.cache_key("http://svc/2"))[1])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["nbytes"], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""http coalesce 单元测试"""
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from common.http_coalesce import SingleFlight, request_key
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_request_key(self):
+        url = "http://svc/a?b=1"
+        key = request_key("GET", url, {"X-Request-Id": "1"}, coalesce=True)
+        self.assertEqual(key, request_key("GET", url, {"X-Request-Id": "2"}, coalesce=True))
+        self.assertNotEqual(key, request_key("GET", url, {"Authorization": "token"}, coalesce=True))
+        self.assertNotEqual(request_key("GET", url, {"X-Api-Token": "alice"}, coalesce=True),
+                            request_key("GET", url, {"X-Api-Token": "bob"}, coalesce=True))
+        self.assertIsNone(request_key("GET", url))
+        self.assertIsNone(request_key("POST", url, data=b"1", coalesce=True))
+        self.assertNotEqual(request_key("PUT", url, data=b"1", coalesce=True),
+                            request_key("PUT", url, data=b"2", coalesce=True))
+
+    def test_do(self):
+        flight = SingleFlight()
+        calls = []
+        barrier = threading.Barrier(8)
+
+        def _func():
+            calls.append(1)
+            time.sleep(0.1)
+            return len(calls)
+
+        def _call(_):
+            barrier.wait()
+            return flight.do("key", _func)
+
+        with ThreadPoolExecutor(8) as executor:
+            self.assertEqual(list(executor.map(_call, range(8))), [1] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), dict(calls=8, shared=7, inflight=0, ratio=7 / 8))
+
+    def test_do_error(self):
+        flight = SingleFlight()
+
+        def _func():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            flight.do("key", _func)
+        self.assertEqual(flight.stats()["inflight"], 0)
+
+    def test_async_do(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def _func():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def _main():
+            tasks = [asyncio.ensure_future(flight.async_do("key", _func)) for _ in range(5)]
+            await asyncio.sleep(0)
+            tasks[0].cancel()  # 单个调用方取消不影响其他调用方
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            return results[1:], await flight.async_do("key", _func)
+
+        results, again = asyncio.run(_main())
+        self.assertEqual(results, ["result"] * 4)
+        self.assertEqual(again, "result")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flight.stats()["shared"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""http pool 单元测试"""
+import asyncio
+import unittest
+
+from common.http_pool import ClientRegistry
+
+
+class TestClientRegistry(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.registry = ClientRegistry()
+
+    def tearDown(self) -> None:
+        self.registry.close()
+
+    def test_get_client(self):
+        client = self.registry.get_client("http://127.0.0.1:8000/a")
+        self.assertIs(self.registry.get_client("http://127.0.0.1:8000/b?c=1"), client)
+        self.assertIsNot(self.registry.get_client("http://127.0.0.1:8001/a"), client)
+        client.close()
+        self.assertIsNot(self.registry.get_client("http://127.0.0.1:8000/a"), client)
+
+    def test_configure(self):
+        self.registry.configure(max_connections=10)
+        self.registry.configure("127.0.0.1", keepalive_expiry=30)
+        limits = self.registry._client_kwargs("127.0.0.1", None)["limits"]  # pylint: disable=protected-access
+        self.assertEqual((limits.max_connections, limits.keepalive_expiry), (10, 30))
+
+    def test_get_async_client(self):
+        async def _get():
+            client = self.registry.get_async_client("http://127.0.0.1:8000/a")
+            self.assertIs(self.registry.get_async_client("http://127.0.0.1:8000/b"), client)
+            return client
+
+        async def _get_and_close():
+            client = await _get()
+            await self.registry.aclose()
+            return client
+
+        # 不同事件循环使用各自的AsyncClient
+        first = asyncio.run(_get())
+        second = asyncio.run(_get_and_close())
+        self.assertIsNot(first, second)
+        self.assertTrue(second.is_closed)
+
+    def test_release_async_clients(self):
+        async def _get():
+            return self.registry.get_async_client("http://127.0.0.1:8000/a")
+
+        # asyncio.run结束时关闭并释放该事件循环的AsyncClient
+        clients = [asyncio.run(_get()) for _ in range(5)]
+        self.assertTrue(all(client.is_closed for client in clients))
+        self.assertEqual(self.registry.stats()["async_clients"], 0)
+        # 未经shutdown_asyncgens关闭的事件循环在下次获取时释放
+        for _ in range(5):
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(_get())
+            loop.close()
+        self.assertEqual(self.registry.stats()["async_clients"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""http retry 单元测试"""
+import asyncio
+import unittest
+
+import httpx
+
+from common import http_retry
+from common.error import QtError, QtException
+
+
+def _response(status_code):
+    return httpx.Response(status_code, request=httpx.Request("GET", "http://svc/a"))
+
+
+class TestRequestWithRetry(unittest.TestCase):
+
+    def setUp(self) -> None:
+        http_retry.BREAKERS.reset()
+        http_retry.configure_breaker(failure_threshold=3, reset_timeout=0.05)
+        self.policy = http_retry.RetryPolicy(2, 0.001, 0.01, frozenset((503,)))
+
+    def tearDown(self) -> None:
+        http_retry.BREAKERS.reset()
+        http_retry.configure_breaker(**http_retry.DEFAULT_BREAKER_CFG._asdict())
+
+    def _sender(self, results):
+        calls = []
+
+        def _send():
+            calls.append(1)
+            result = results[min(len(calls), len(results)) - 1]
+            if isinstance(result, Exception):
+                raise result
+            return _response(result)
+        return _send, calls
+
+    def test_retry_status(self):
+        send, calls = self._sender([503, 503, 200])
+        resp = http_retry.request_with_retry(send, "http://svc/a", "GET", policy=self.policy)
+        self.assertEqual((resp.status_code, len(calls)), (200, 3))
+        # 重试用尽返回最后一次响应
+        send, calls = self._sender([503])
+        resp = http_retry.request_with_retry(send, "http://svc/a", "GET", policy=self.policy)
+        self.assertEqual((resp.status_code, len(calls)), (503, 3))
+
+    def test_idempotency(self):
+        send, calls = self._sender([503, 200])
+        resp = http_retry.request_with_retry(send, "http://svc/a", "POST", policy=self.policy)
+        self.assertEqual((resp.status_code, len(calls)), (503, 1))
+        send, calls = self._sender([503, 200])
+        resp = http_retry.request_with_retry(send, "http://svc/a", "POST", {"Idempotency-Key": "k"},
+                                             policy=self.policy)
+        self.assertEqual((resp.status_code, len(calls)), (200, 2))
+        # 未发出的请求可重试，已发出的非幂等请求不重试
+        send, calls = self._sender([httpx.ConnectError("refused"), 200])
+        http_retry.request_with_retry(send, "http://svc/a", "POST", policy=self.policy)
+        self.assertEqual(len(calls), 2)
+        send, calls = self._sender([httpx.ReadTimeout("timeout"), 200])
+        with self.assertRaises(httpx.ReadTimeout):
+            http_retry.request_with_retry(send, "http://svc/a", "POST", policy=self.policy)
+
+    def test_budget(self):
+        breaker = http_retry.BREAKERS.get("http://svc/a")
+        breaker.budget.tokens = 1.0
+        send, calls = self._sender([503, 503, 200])
+        resp = http_retry.request_with_retry(send, "http://svc/a", "GET", policy=self.policy)
+        self.assertEqual((resp.status_code, len(calls)), (503, 2))
+        self.assertEqual(breaker.budget.exhausted, 1)
+
+    def test_circuit_breaker(self):
+        send, calls = self._sender([httpx.ConnectError("refused")])
+        with self.assertRaises(httpx.ConnectError):
+            http_retry.request_with_retry(send, "http://svc/a", "GET", policy=self.policy)
+        # 连续3次失败熔断，不再发出请求
+        with self.assertRaises(QtException) as ctx:
+            http_retry.request_with_retry(send, "http://svc/a", "GET", policy=self.policy)
+        self.assertEqual(ctx.exception.error, QtError.E_CIRCUIT_OPEN)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(http_retry.breaker_stats()["svc"]["state"], "open")
+
+        async def _probe():
+            await asyncio.sleep(0.06)
+
+            async def _send():
+                return _response(200)
+            return await http_retry.async_request_with_retry(_send, "http://svc/a", "GET", policy=self.policy)
+
+        # 半开状态探测成功后恢复
+        self.assertEqual(asyncio.run(_probe()).status_code, 200)
+        self.assertEqual(http_retry.breaker_stats()["svc"]["state"], "closed")
+
+    def test_breaker_statuses(self):
+        # 应用返回的500不计入熔断失败，502/503/504计入
+        send, calls = self._sender([500])
+        for _ in range(5):
+            resp = http_retry.request_with_retry(send, "http://svc/a", "GET", policy=self.policy)
+            self.assertEqual(resp.status_code, 500)
+        self.assertEqual(http_retry.breaker_stats()["svc"]["state"], "closed")
+        send, calls = self._sender([502])
+        for _ in range(3):
+            http_retry.request_with_retry(send, "http://svc/a", "GET", policy=http_retry.NO_RETRY)
+        self.assertEqual(http_retry.breaker_stats()["svc"]["state"], "open")
+
+    def test_half_open_probe_limit(self):
+        breaker = http_retry.CircuitBreaker("svc", http_retry.BreakerCfg(1, 0.0, 1))
+        breaker.on_failure()
+        breaker.acquire()
+        with self.assertRaises(QtException):
+            breaker.acquire()
+        breaker.release()
+        breaker.acquire()
+        breaker.on_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()